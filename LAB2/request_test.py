@@ -1,9 +1,20 @@
+import os
 import sys
+import json
+import math
 import time
+import socket
+import ssl
+import subprocess
+import http.client
 import urllib.request
 import urllib.error
 import threading
-from typing import Tuple, List
+from typing import Dict, Tuple, List, Optional
+
+COORD_HOST = os.environ.get("COORD_HOST", "127.0.0.1")
+COORD_PORT = int(os.environ.get("COORD_PORT", "9100"))
+JOIN_TIMEOUT = float(os.environ.get("JOIN_TIMEOUT", "60"))
 
 
 def make_request(url: str, request_id: int, results: List, lock: threading.Lock) -> None:
@@ -29,14 +40,8 @@ def make_request(url: str, request_id: int, results: List, lock: threading.Lock)
         results.append(result)
 
 
-def run_concurrent_test(url: str, num_requests: int, delay_between: float = 0) -> None:
-    print(f"\n{'=' * 70}")
-    print(f"Testing URL: {url}")
-    print(f"Number of concurrent requests: {num_requests}")
-    if delay_between > 0:
-        print(f"Request submission delay: {delay_between:.3f}s (rate: {1 / delay_between:.2f} req/s)")
-    print(f"{'=' * 70}\n")
-
+def execute_requests(url: str, num_requests: int, delay_between: float = 0) -> Tuple[List, float]:
+    # Fire the requests, returns the per-request results and the wall time
     results: List[Tuple[int, float, bool, str]] = []
     results_lock = threading.Lock()
     threads = []
@@ -62,7 +67,18 @@ def run_concurrent_test(url: str, num_requests: int, delay_between: float = 0) -
     for thread in threads:
         thread.join()
 
-    overall_duration = time.time() - overall_start
+    return results, time.time() - overall_start
+
+
+def run_concurrent_test(url: str, num_requests: int, delay_between: float = 0) -> None:
+    print(f"\n{'=' * 70}")
+    print(f"Testing URL: {url}")
+    print(f"Number of concurrent requests: {num_requests}")
+    if delay_between > 0:
+        print(f"Request submission delay: {delay_between:.3f}s (rate: {1 / delay_between:.2f} req/s)")
+    print(f"{'=' * 70}\n")
+
+    results, overall_duration = execute_requests(url, num_requests, delay_between)
 
     # calculate statistics
     successful_requests = [r for r in results if r[2]]
@@ -96,12 +112,402 @@ def run_concurrent_test(url: str, num_requests: int, delay_between: float = 0) -
     print()
 
 
+class LatencyHistogram:
+    """Log-scale latency buckets (~5% wide) that can be merged across processes."""
+
+    BASE = 1.05
+
+    def __init__(self, buckets: Optional[Dict[int, int]] = None):
+        self.buckets: Dict[int, int] = dict(buckets or {})
+
+    def add(self, seconds: float) -> None:
+        micros = max(seconds * 1e6, 1.0)
+        bucket = int(math.log(micros, self.BASE))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    def count(self) -> int:
+        return sum(self.buckets.values())
+
+    def percentile(self, pct: float) -> float:
+        # upper edge of the bucket holding the pct-th value, in seconds
+        total = self.count()
+        if not total:
+            return 0.0
+        rank = math.ceil(total * pct / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return self.BASE ** (bucket + 1) / 1e6
+        return 0.0
+
+    def to_json(self) -> Dict[str, int]:
+        return {str(k): v for k, v in self.buckets.items()}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, int]) -> "LatencyHistogram":
+        return cls({int(k): int(v) for k, v in data.items()})
+
+
+# coordinator/worker protocol: one JSON object per line over TCP
+#   worker -> hello, coordinator -> scenario, worker -> ready,
+#   coordinator -> go (the shared start barrier), worker -> result
+
+def send_msg(f, msg: Dict) -> None:
+    f.write((json.dumps(msg) + "\n").encode())
+    f.flush()
+
+
+def recv_msg(f) -> Dict:
+    line = f.readline()
+    if not line:
+        raise ConnectionError("peer closed the connection")
+    return json.loads(line)
+
+
+def run_worker(coord_host: str, coord_port: int) -> None:
+    with socket.create_connection((coord_host, coord_port), timeout=JOIN_TIMEOUT) as s:
+        s.settimeout(None)
+        f = s.makefile("rwb")
+        send_msg(f, {"type": "hello", "host": socket.gethostname(), "pid": os.getpid()})
+        scenario = recv_msg(f)
+        send_msg(f, {"type": "ready"})
+        recv_msg(f)  # go
+
+        results, duration = execute_requests(scenario["url"], scenario["requests"], scenario["delay"])
+        histogram = LatencyHistogram()
+        outcomes: Dict[str, int] = {}
+        for _, latency, success, status in results:
+            outcomes[status] = outcomes.get(status, 0) + 1
+            if success:
+                histogram.add(latency)
+        send_msg(f, {"type": "result", "duration": duration, "outcomes": outcomes,
+                     "histogram": histogram.to_json()})
+
+
+def run_coordinator(url: str, num_requests: int, local_workers: int, remote_workers: int,
+                    delay_between: float) -> None:
+    expected = local_workers + remote_workers
+    print(f"\n{'=' * 70}")
+    print(f"Testing URL: {url}")
+    print(f"Workers: {local_workers} local + {remote_workers} remote, {num_requests} requests each")
+    print(f"Coordinator listening on {COORD_HOST}:{COORD_PORT}")
+    print(f"{'=' * 70}\n")
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((COORD_HOST, COORD_PORT))
+        server.listen(expected)
+        server.settimeout(JOIN_TIMEOUT)
+
+        connect_host = "127.0.0.1" if COORD_HOST in ("0.0.0.0", "") else COORD_HOST
+        procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker",
+                                   connect_host, str(COORD_PORT)])
+                 for _ in range(local_workers)]
+
+        workers = []
+        try:
+            while len(workers) < expected:
+                conn, addr = server.accept()
+                conn.settimeout(None)
+                f = conn.makefile("rwb")
+                hello = recv_msg(f)
+                workers.append((conn, f, f"{hello['host']}:{hello['pid']}"))
+                print(f"Worker joined: {workers[-1][2]} ({len(workers)}/{expected})")
+        except socket.timeout:
+            print(f"Error: only {len(workers)} of {expected} workers joined within {JOIN_TIMEOUT:.0f}s")
+            for p in procs:
+                p.kill()
+            sys.exit(1)
+
+        scenario = {"type": "scenario", "url": url, "requests": num_requests, "delay": delay_between}
+        for _, f, _ in workers:
+            send_msg(f, scenario)
+        for _, f, _ in workers:
+            recv_msg(f)  # ready
+
+        # start barrier: everyone gets "go" at the same moment
+        started = time.time()
+        for _, f, _ in workers:
+            send_msg(f, {"type": "go"})
+
+        histogram = LatencyHistogram()
+        outcomes: Dict[str, int] = {}
+        per_worker = []
+        for conn, f, name in workers:
+            result = recv_msg(f)
+            worker_hist = LatencyHistogram.from_json(result["histogram"])
+            histogram.merge(worker_hist)
+            for status, count in result["outcomes"].items():
+                outcomes[status] = outcomes.get(status, 0) + count
+            per_worker.append((name, result["duration"], worker_hist))
+            conn.close()
+        overall_duration = time.time() - started
+
+        for p in procs:
+            p.wait()
+
+    total = sum(outcomes.values())
+    successful = histogram.count()
+    print(f"\n{'=' * 70}")
+    print(f"MERGED RESULTS ({len(workers)} workers)")
+    print(f"{'=' * 70}")
+    print(f"Total requests:        {total}")
+    print(f"Successful:            {successful}")
+    print(f"Failed:                {total - successful}")
+    print(f"Total time:            {overall_duration:.3f}s")
+    print(f"Successful req/sec:    {successful / overall_duration if overall_duration > 0 else 0:.2f}")
+    print(f"Latency p50/p90/p99:   {histogram.percentile(50) * 1000:.1f} / "
+          f"{histogram.percentile(90) * 1000:.1f} / {histogram.percentile(99) * 1000:.1f} ms")
+    print(f"{'=' * 70}")
+    for name, duration, worker_hist in per_worker:
+        print(f"  {name:<30} {worker_hist.count():>6} ok in {duration:.3f}s, "
+              f"p50 {worker_hist.percentile(50) * 1000:.1f} ms")
+    failed = {k: v for k, v in outcomes.items() if not k.startswith("HTTP 2")}
+    if failed:
+        print(f"\nFailed Request Details:")
+        for error_type, count in sorted(failed.items()):
+            print(f"  {error_type}: {count}")
+    print()
+
+
+# trace replay (traces come from server_mt.py with TRACE_FILE set)
+
+TraceEntry = Tuple[float, str, int]  # (t, path, recorded status)
+
+
+def source_addresses(host: str, count: int) -> List[Optional[str]]:
+    """Distinct loopback source IPs when the target is local (Linux), else the default address."""
+    if not host.startswith("127.") or not sys.platform.startswith("linux"):
+        return [None]
+    return [f"127.0.{1 + i // 250}.{1 + i % 250}" for i in range(count)]
+
+
+def load_trace(path: str) -> Dict[str, List[TraceEntry]]:
+    """Group trace lines by client id, each client's requests in their original order."""
+    clients: Dict[str, List[TraceEntry]] = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            clients.setdefault(rec["client"], []).append((float(rec["t"]), rec["path"], int(rec["status"])))
+    for entries in clients.values():
+        entries.sort(key=lambda e: e[0])
+    return clients
+
+
+def replay_client(host: str, port: int, source: Optional[str], entries: List[TraceEntry],
+                  t0: float, start: float, speed: Optional[float], histogram: "LatencyHistogram",
+                  outcomes: Dict[str, int], lock: threading.Lock) -> None:
+    # one thread per client: requests go out one after another, never reordered
+    for t, path, _ in entries:
+        if speed is not None:
+            wait = start + (t - t0) / speed - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        started = time.time()
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=120,
+                                              source_address=(source, 0) if source else None)
+            conn.request("GET", path or "/")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            outcome = f"HTTP {response.status}"
+        except (OSError, http.client.HTTPException) as e:
+            outcome = type(e).__name__
+        latency = time.time() - started
+        with lock:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if outcome.startswith("HTTP"):
+                histogram.add(latency)
+
+
+def run_replay(host: str, port: int, trace_path: str, speed: Optional[float]) -> None:
+    clients = load_trace(trace_path)
+    entries = [e for client in clients.values() for e in client]
+    if not entries:
+        print(f"Error: trace '{trace_path}' is empty")
+        sys.exit(1)
+    t0 = min(e[0] for e in entries)
+    span = max(e[0] for e in entries) - t0
+    recorded: Dict[str, int] = {}
+    for _, _, status in entries:
+        recorded[f"HTTP {status}"] = recorded.get(f"HTTP {status}", 0) + 1
+
+    # give every recorded client its own source address when replaying locally,
+    # so the per-IP rate limit sees the same clients as in the recording
+    sources = source_addresses(host, len(clients))
+
+    print(f"\n{'=' * 70}")
+    print(f"Replaying {trace_path} against {host}:{port}")
+    print(f"{len(entries)} requests from {len(clients)} clients over {span:.1f}s, "
+          f"speed: {'max' if speed is None else f'{speed:g}x'}")
+    print(f"{'=' * 70}\n")
+
+    histogram = LatencyHistogram()
+    outcomes: Dict[str, int] = {}
+    lock = threading.Lock()
+    start = time.time() + 0.1
+    threads = [threading.Thread(target=replay_client,
+                                args=(host, port, sources[i % len(sources)], client_entries, t0, start,
+                                      speed, histogram, outcomes, lock),
+                                daemon=True)
+               for i, client_entries in enumerate(clients.values())]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    overall_duration = time.time() - start
+
+    print(f"{'=' * 70}")
+    print(f"REPLAY RESULTS")
+    print(f"{'=' * 70}")
+    print(f"Total requests:        {len(entries)}")
+    print(f"Answered:              {histogram.count()}")
+    print(f"Total time:            {overall_duration:.3f}s (trace span {span:.3f}s)")
+    print(f"Requests/sec:          {len(entries) / overall_duration if overall_duration > 0 else 0:.2f}")
+    print(f"Latency p50/p90/p99:   {histogram.percentile(50) * 1000:.1f} / "
+          f"{histogram.percentile(90) * 1000:.1f} / {histogram.percentile(99) * 1000:.1f} ms")
+    print(f"\n{'outcome':<24} {'recorded':>9} {'replayed':>9}")
+    for outcome in sorted(set(recorded) | set(outcomes)):
+        print(f"{outcome:<24} {recorded.get(outcome, 0):>9} {outcomes.get(outcome, 0):>9}")
+    print()
+
+
+# TLS vs plaintext benchmark (server_mt.py with TLS_PORT set)
+
+def tls_client_context() -> ssl.SSLContext:
+    # the test server uses a self-signed certificate
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def fetch_timed(host: str, port: int, path: str, ctx: Optional[ssl.SSLContext]) -> Tuple[int, float, Optional[ssl.SSLSession]]:
+    """GET path once; returns (bytes received, seconds from first response byte to EOF, TLS session)."""
+    with socket.create_connection((host, port), timeout=120) as raw:
+        s = ctx.wrap_socket(raw, server_hostname=host) if ctx else raw
+        s.sendall(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        buf = bytearray(256 * 1024)
+        received = s.recv_into(buf)
+        first_byte = time.perf_counter()
+        while True:
+            n = s.recv_into(buf)
+            if not n:
+                break
+            received += n
+        elapsed = time.perf_counter() - first_byte
+        session = s.session if ctx else None
+        s.close()
+    return received, elapsed, session
+
+
+def handshake_rate(host: str, port: int, ctx: ssl.SSLContext, seconds: float,
+                   session: Optional[ssl.SSLSession]) -> Tuple[int, int]:
+    """Open TLS connections back to back for `seconds`; returns (handshakes, resumed)."""
+    done = resumed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        with socket.create_connection((host, port), timeout=10) as raw:
+            with ctx.wrap_socket(raw, server_hostname=host, session=session) as s:
+                done += 1
+                resumed += s.session_reused
+    return done, resumed
+
+
+def run_tls_benchmark(host: str, port: int, tls_port: int, path: str, seconds: float, rounds: int = 3) -> None:
+    print(f"\n{'=' * 70}")
+    print(f"TLS benchmark: http://{host}:{port} vs https://{host}:{tls_port}, {path}")
+    print(f"{'=' * 70}\n")
+
+    ctx = tls_client_context()
+    full, _ = handshake_rate(host, tls_port, ctx, seconds, None)
+    # one real request so the server's session ticket arrives, then reuse it
+    _, _, session = fetch_timed(host, tls_port, "/", ctx)
+    time.sleep(1.0)  # stay under the per-IP rate limit
+    reused, resumed = handshake_rate(host, tls_port, ctx, seconds, session)
+    print(f"Full handshakes:       {full / seconds:8.1f} /s")
+    print(f"Resumed handshakes:    {reused / seconds:8.1f} /s ({resumed} of {reused} actually resumed)")
+
+    print(f"\n{'transport':<10} {'bytes':>12} {'MB/s':>10}   (transfer time from first response byte)")
+    for name, port_, client_ctx in (("plain", port, None), ("tls", tls_port, ctx)):
+        total = 0
+        elapsed = 0.0
+        for _ in range(rounds):
+            received, took, _ = fetch_timed(host, port_, path, client_ctx)
+            total += received
+            elapsed += took
+            time.sleep(0.25)
+        print(f"{name:<10} {total // rounds:>12} {total / elapsed / 1e6 if elapsed > 0 else 0:>10.1f}")
+    print()
+
+
+def main_distributed(args: List[str]) -> None:
+    if args[0] == "worker":
+        if len(args) != 3:
+            print("Usage: python3 request_test.py worker <coordinator_ip> <coordinator_port>")
+            sys.exit(1)
+        run_worker(args[1], int(args[2]))
+        return
+
+    if len(args) < 6 or len(args) > 8:
+        print("Usage: python3 request_test.py coordinate <ip> <port> <path> <nr_req_per_worker> "
+              "<local_workers> [remote_workers] [delay]")
+        sys.exit(1)
+    path = args[3] if args[3].startswith("/") else "/" + args[3]
+    url = f"http://{args[1]}:{args[2]}{path}"
+    remote_workers = int(args[6]) if len(args) > 6 else 0
+    delay_between = float(args[7]) if len(args) > 7 else 0
+    run_coordinator(url, int(args[4]), int(args[5]), remote_workers, delay_between)
+
+
+def main_replay(args: List[str]) -> None:
+    if len(args) < 4 or len(args) > 5:
+        print("Usage: python3 request_test.py replay <ip> <port> <trace_file> [speed|max]")
+        sys.exit(1)
+    speed = None if len(args) > 4 and args[4] == "max" else float(args[4]) if len(args) > 4 else 1.0
+    if speed is not None and speed <= 0:
+        print("Error: speed must be positive (or 'max')")
+        sys.exit(1)
+    run_replay(args[1], int(args[2]), args[3], speed)
+
+
+def main_tls(args: List[str]) -> None:
+    if len(args) < 5 or len(args) > 6:
+        print("Usage: python3 request_test.py tls <ip> <port> <tls_port> <path> [seconds]")
+        sys.exit(1)
+    path = args[4] if args[4].startswith("/") else "/" + args[4]
+    seconds = float(args[5]) if len(args) > 5 else 3.0
+    run_tls_benchmark(args[1], int(args[2]), int(args[3]), path, seconds)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "tls":
+        main_tls(sys.argv[1:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] in ("coordinate", "worker"):
+        main_distributed(sys.argv[1:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        main_replay(sys.argv[1:])
+        return
+
     if len(sys.argv) < 5 or len(sys.argv) > 6:
         print("Usage: python3 request_test.py <ip> <port> <path> <nr_req> [delay]")
         print("\nExamples:")
         print("  python3 request_test.py 127.0.0.1 8001 public/index.html 100")
         print("  python3 request_test.py localhost 8001 public/index.html 100 0.25")
+        print("  python3 request_test.py coordinate 127.0.0.1 8001 public/index.html 50 4")
+        print("  python3 request_test.py worker <coordinator_ip> 9100")
+        print("  python3 request_test.py replay 127.0.0.1 8001 trace.jsonl 10")
+        print("  python3 request_test.py tls 127.0.0.1 8001 8443 public/winter.png")
         sys.exit(1)
 
     ip = sys.argv[1]
@@ -1,21 +1,54 @@
-import os, sys, socket, mimetypes
+import os, sys, socket, mimetypes, stat, mmap, json, signal, ipaddress, hashlib, ssl, subprocess, tempfile, posixpath
+from array import array
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
 from urllib.parse import unquote, quote
 import threading
 import time
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
 # config
 HOST = "0.0.0.0"
 PORT = int(os.environ.get("PORT", "8001"))
 ALLOWED_EXTENSIONS = {".html", ".png", ".pdf"}
 MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "16"))
-COUNTS: Dict[str, int] = {}
 COUNTS_LOCK = threading.Lock()
 REQUESTS_PER_SECOND = 5
 TIME_WINDOW = 1.0
+RESOLVE_TTL = float(os.environ.get("RESOLVE_TTL", "2.0"))
+RESOLVE_CACHE_MAX = int(os.environ.get("RESOLVE_CACHE_MAX", "4096"))
+CACHE_BUDGET = int(os.environ.get("CACHE_BUDGET", str(32 * 1024 * 1024)))
+CACHE_MAX_FILE = int(os.environ.get("CACHE_MAX_FILE", str(256 * 1024)))
+MMAP_IDLE = float(os.environ.get("MMAP_IDLE", "30"))
+COALESCE_WAIT = float(os.environ.get("COALESCE_WAIT", "5"))
+KEEPALIVE_TIMEOUT = float(os.environ.get("KEEPALIVE_TIMEOUT", "5"))
+KEEPALIVE_MAX = int(os.environ.get("KEEPALIVE_MAX", "100"))
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "10"))
+MAX_HEADER_BYTES = 16 * 1024
+CONFIG_FILE = os.environ.get("CONFIG_FILE")
+COUNTS_FILE = os.environ.get("COUNTS_FILE")
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", "30"))
+REUSE_PORT = os.environ.get("REUSE_PORT", "0") == "1"
+# relative share of MAX_WORKERS for each request class
+SCHED_WEIGHTS = os.environ.get("SCHED_WEIGHTS", "small=2,listing=1,bulk=1")
+SCHED_QUEUE = int(os.environ.get("SCHED_QUEUE", "64"))
+SCHED_WAIT = float(os.environ.get("SCHED_WAIT", "10"))
+# "off", "on" (before accepting) or "background" (while already serving)
+WARMUP = os.environ.get("WARMUP", "off")
+BULK_THRESHOLD = int(os.environ.get("BULK_THRESHOLD", str(CACHE_MAX_FILE)))
+# byte-rate limits for file bodies, in bytes per second (0 = unlimited)
+BANDWIDTH_PER_IP = int(os.environ.get("BANDWIDTH_PER_IP", "0"))
+BANDWIDTH_TOTAL = int(os.environ.get("BANDWIDTH_TOTAL", "0"))
+SEND_QUANTUM = 64 * 1024
+# JSON-lines request trace for request_test.py replay (unset = no tracing)
+TRACE_FILE = os.environ.get("TRACE_FILE")
+# optional HTTPS listener next to the plain one (0 = off); without TLS_CERT/TLS_KEY
+# a throwaway self-signed certificate for localhost is generated with openssl
+TLS_PORT = int(os.environ.get("TLS_PORT", "0"))
+TLS_CERT = os.environ.get("TLS_CERT")
+TLS_KEY = os.environ.get("TLS_KEY")
+TLS_WRITE = 256 * 1024
 
-
-client_requests: Dict[str, List[float]] = {}
 requests_lock = threading.Lock()
 
 # ensure common types exist
@@ -23,6 +56,10 @@ mimetypes.init()
 mimetypes.add_type("application/pdf", ".pdf")
 mimetypes.add_type("image/png", ".png")
 mimetypes.add_type("text/html; charset=utf-8", ".html")
+# only these extensions are ever served, so look their types up once
+MIME_TYPES: Dict[str, Optional[str]] = {
+    ext: mimetypes.guess_type("file" + ext)[0] for ext in ALLOWED_EXTENSIONS
+}
 
 
 def file_size(num_bytes: int) -> str:
@@ -33,6 +70,78 @@ def file_size(num_bytes: int) -> str:
     return f"{num_bytes:.1f} TB"
 
 
+class PathCounters:
+    """Hit counters keyed by a 64-bit hash of the path, in two flat arrays.
+
+    An open-addressing table: no string, int or dict entry is kept per path,
+    only 16 bytes (plus free space). Paths are not recoverable, so items()
+    reports hex hashes; update() accepts those as well as plain paths.
+    """
+    __slots__ = ("_keys", "_counts", "_used")
+
+    def __init__(self, capacity: int = 1024):
+        self._keys = array("Q", bytes(8 * capacity))
+        self._counts = array("Q", bytes(8 * capacity))
+        self._used = 0
+
+    @staticmethod
+    def path_hash(path: str) -> int:
+        digest = hashlib.blake2b(path.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+        # 0 marks an empty slot
+        return int.from_bytes(digest, "little") or 1
+
+    def _find(self, h: int) -> int:
+        keys = self._keys
+        mask = len(keys) - 1
+        i = h & mask
+        while keys[i] and keys[i] != h:
+            i = (i + 1) & mask
+        return i
+
+    def get(self, path: str, default: int = 0) -> int:
+        i = self._find(self.path_hash(path))
+        return self._counts[i] if self._keys[i] else default
+
+    def __setitem__(self, path: str, value: int) -> None:
+        self._set(self.path_hash(path), value)
+
+    def __len__(self) -> int:
+        return self._used
+
+    def _set(self, h: int, value: int) -> None:
+        i = self._find(h)
+        if not self._keys[i]:
+            if (self._used + 1) * 3 > len(self._keys) * 2:
+                self._grow()
+                i = self._find(h)
+            self._keys[i] = h
+            self._used += 1
+        self._counts[i] = value
+
+    def _grow(self) -> None:
+        old = zip(self._keys, self._counts)
+        size = len(self._keys) * 2
+        self._keys = array("Q", bytes(8 * size))
+        self._counts = array("Q", bytes(8 * size))
+        for h, count in old:
+            if h:
+                i = self._find(h)
+                self._keys[i] = h
+                self._counts[i] = count
+
+    def items(self) -> List[Tuple[str, int]]:
+        return [(f"{h:016x}", count) for h, count in zip(self._keys, self._counts) if h]
+
+    def update(self, values: Dict[str, int]) -> None:
+        for key, value in values.items():
+            # request paths always start with "/", so they never look like a hash
+            h = int(key, 16) if len(key) == 16 and not key.startswith("/") else self.path_hash(key)
+            self._set(h, value)
+
+
+COUNTS = PathCounters()
+
+
 def _bump_count(path_key: str):
     with COUNTS_LOCK:
         current = COUNTS.get(path_key, 0)
@@ -40,42 +149,712 @@ def _bump_count(path_key: str):
         COUNTS[path_key] = current + 1
 
 
-def respond(conn, status, headers, body):
-    head = [f"HTTP/1.1 {status}".encode()]
+def ip_key(ip: str) -> int:
+    """Pack an IPv4/IPv6 address into one int; IPv6 gets bit 128 set so it never collides with IPv4."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        # not an IP (e.g. a unix socket peer), fall back to a hash outside both ranges
+        return hash(ip) | (1 << 129)
+    return int(addr) if addr.version == 4 else int(addr) | (1 << 128)
+
+
+class ClientWindows:
+    """Sliding-window rate limiter state for many clients in flat arrays.
+
+    Each client owns `limit` consecutive doubles in one array('d') holding the
+    times of its last accepted requests, used as a ring. A request is allowed
+    when the oldest of them has left the window, which is the same rule as
+    keeping a list of timestamps and trimming it. Slots of clients that have
+    been quiet for a whole window are reused.
+    """
+    __slots__ = ("limit", "_slots", "_times", "_heads", "_free", "_last_sweep")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._slots: Dict[int, int] = {}
+        self._times = array("d")
+        self._heads = array("I")
+        self._free: List[int] = []
+        self._last_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def allow(self, key: int, now: float, window: float) -> bool:
+        if self.limit <= 0:
+            return False
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = self._new_slot(now, window)
+        base = slot * self.limit
+        head = self._heads[slot]
+        oldest = self._times[base + head]
+        if oldest and now - oldest < window:
+            return False
+        self._times[base + head] = now
+        self._heads[slot] = (head + 1) % self.limit
+        return True
+
+    def _new_slot(self, now: float, window: float) -> int:
+        if not self._free and now - self._last_sweep >= window:
+            self._sweep(now, window)
+        if self._free:
+            slot = self._free.pop()
+            base = slot * self.limit
+            for i in range(base, base + self.limit):
+                self._times[i] = 0.0
+            self._heads[slot] = 0
+            return slot
+        self._times.extend([0.0] * self.limit)
+        self._heads.append(0)
+        return len(self._heads) - 1
+
+    def _sweep(self, now: float, window: float) -> None:
+        self._last_sweep = now
+        limit = self.limit
+        times = self._times
+        for key, slot in list(self._slots.items()):
+            base = slot * limit
+            newest = max(times[base:base + limit])
+            if now - newest >= window:
+                del self._slots[key]
+                self._free.append(slot)
+
+
+CLIENT_WINDOWS = ClientWindows(REQUESTS_PER_SECOND)
+
+
+# pre-encoded status lines and header lines that almost every response uses
+_STATUS_LINES: Dict[str, bytes] = {}
+_HEADER_LINES: Dict[Tuple[str, str], bytes] = {
+    (k, v): f"{k}: {v}\r\n".encode()
+    for k, v in (
+        ("Content-Type", "text/html; charset=utf-8"),
+        ("Content-Type", "text/plain"),
+        ("Content-Type", "application/pdf"),
+        ("Content-Type", "image/png"),
+        ("Connection", "close"),
+        ("Connection", "keep-alive"),
+        ("Retry-After", "1"),
+        ("Allow", "GET"),
+        ("Accept-Ranges", "bytes"),
+    )
+}
+FILE_HEAD_CACHE_MAX = 1024
+_file_heads: Dict[Tuple[str, int, int, str, bool], bytes] = {}
+
+
+def build_head(status: str, headers: Dict[str, str]) -> bytes:
+    status_line = _STATUS_LINES.get(status)
+    if status_line is None:
+        status_line = _STATUS_LINES.setdefault(status, f"HTTP/1.1 {status}\r\n".encode())
+    parts = [status_line]
     for k, v in headers.items():
-        head.append(f"{k}: {v}".encode())
-    head.append(b"")
-    head.append(b"")
-    conn.sendall(b"\r\n".join(head) + body)
+        line = _HEADER_LINES.get((k, v))
+        parts.append(line if line is not None else f"{k}: {v}\r\n".encode())
+    parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+def etag_for(digest: str) -> str:
+    # content based, so identical files under different paths share one ETag
+    return f'"{digest}"'
+
+
+def http_date(ts: float) -> str:
+    return formatdate(ts, usegmt=True)
+
+
+def not_modified(headers: Dict[str, str], st: os.stat_result, etag: str) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(st.st_mtime) <= since
+    return False
 
 
-def _is_subpath(child: str, parent: str) -> bool:
-    child_real = os.path.realpath(child)
-    parent_real = os.path.realpath(parent)
+def range_applies(headers: Dict[str, str], st: os.stat_result, etag: str) -> bool:
+    # If-Range: only send a part when the client's copy is of this version
+    condition = headers.get("if-range")
+    if condition is None:
+        return True
+    if condition.startswith('"') or condition.startswith("W/"):
+        return condition == etag
+    return condition == http_date(st.st_mtime)
+
+
+def file_head(st: os.stat_result, digest: str, mime_type: str, keep_alive: bool = False) -> bytes:
+    # the header block of a file only changes when the file does
+    key = (digest, st.st_mtime_ns, mime_type, keep_alive)
+    head = _file_heads.get(key)
+    if head is None:
+        head = build_head("200 OK", {"Content-Type": mime_type, "Accept-Ranges": "bytes",
+                                     "ETag": etag_for(digest), "Last-Modified": http_date(st.st_mtime),
+                                     "Content-Length": str(st.st_size),
+                                     "Connection": "keep-alive" if keep_alive else "close"})
+        if len(_file_heads) >= FILE_HEAD_CACHE_MAX:
+            _file_heads.clear()
+        _file_heads[key] = head
+    return head
+
+
+def _send_tls(conn: ssl.SSLSocket, buffers) -> None:
+    # no sendmsg/sendfile under TLS: pack small pieces (the head) together and
+    # write the body in TLS_WRITE slices so each call encrypts a lot at once
+    out = bytearray()
+    for buf in buffers:
+        view = memoryview(buf)
+        while len(view):
+            if not out and len(view) >= TLS_WRITE:
+                conn.sendall(view[:TLS_WRITE])
+                view = view[TLS_WRITE:]
+                continue
+            take = TLS_WRITE - len(out)
+            out += view[:take]
+            view = view[take:]
+            if len(out) == TLS_WRITE:
+                conn.sendall(out)
+                out.clear()
+    if out:
+        conn.sendall(out)
+
+
+def _send_gather(conn, buffers) -> None:
+    if TRACE is not None:
+        TRACE.sending(buffers)
+    if isinstance(conn, ssl.SSLSocket):
+        _send_tls(conn, buffers)
+        return
+    if not hasattr(conn, "sendmsg"):
+        for buf in buffers:
+            conn.sendall(buf)
+        return
+    views = [memoryview(buf) for buf in buffers if len(buf)]
+    while views:
+        sent = conn.sendmsg(views)
+        while sent:
+            first = views[0]
+            if sent >= len(first):
+                sent -= len(first)
+                views.pop(0)
+            else:
+                views[0] = first[sent:]
+                sent = 0
+
+
+def send_buffers(conn, buffers, throttle: Optional[Callable[[int], None]] = None) -> None:
+    """Write all buffers with scatter/gather sendmsg so the body is never copied into the head.
+
+    With a throttle, the data goes out in SEND_QUANTUM slices and each slice
+    is paid for with throttle(nbytes) before it is sent.
+    """
+    if throttle is None:
+        _send_gather(conn, buffers)
+        return
+    group: List[memoryview] = []
+    group_size = 0
+    for buf in buffers:
+        view = memoryview(buf)
+        offset = 0
+        while offset < len(view):
+            piece = view[offset:offset + SEND_QUANTUM - group_size]
+            group.append(piece)
+            group_size += len(piece)
+            offset += len(piece)
+            if group_size == SEND_QUANTUM:
+                throttle(group_size)
+                _send_gather(conn, group)
+                group, group_size = [], 0
+    if group:
+        throttle(group_size)
+        _send_gather(conn, group)
+
+
+def respond(conn, status, headers, body, throttle: Optional[Callable[[int], None]] = None):
+    send_buffers(conn, [build_head(status, headers), body], throttle)
+
+
+def _is_subpath(child_real: str, parent_real: str) -> bool:
+    # both paths must already be realpath()-ed, so this never touches the disk
     try:
         return os.path.commonpath([child_real, parent_real]) == parent_real
     except ValueError:
         return False
 
 
-def allow_request(ip: str) -> bool:
-    #  Check if request from IP should be allowed based on rate limit
-    now = time.time()
+def _normalize_target(target: str) -> Optional[str]:
+    """Turn an unquoted URL path into a relative path, or None if it tries to escape the root."""
+    if "\x00" in target or "\\" in target:
+        return None
+    stripped = target.lstrip("/")
+    if not stripped:
+        return ""
+    # dot-segments collapse like in a URL; only climbing above the root is refused
+    rel = posixpath.normpath(stripped)
+    if rel == ".":
+        return ""
+    if rel == ".." or rel.startswith("../"):
+        return None
+    return rel
 
-    with requests_lock:
-        if ip not in client_requests:
-            client_requests[ip] = []
 
-        timestamps = client_requests[ip]
+Resolved = Tuple[str, str, os.stat_result]
+
+
+class PathResolver:
+    """Maps URL paths to (abs_path, kind, stat) under a fixed root.
+
+    The root is realpath()-ed once. Results, including misses, are cached for
+    RESOLVE_TTL seconds so hot paths skip realpath/stat entirely; after that a
+    hit is revalidated with a single stat() of the resolved path.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self._cache: Dict[str, Tuple[float, Optional[Resolved]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, target: str) -> Optional[Resolved]:
+        rel = _normalize_target(target)
+        if rel is None:
+            return None
+        now = time.monotonic()
+        entry = self._cache.get(rel)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        result = None
+        if entry is not None and entry[1] is not None:
+            result = self._revalidate(entry[1])
+        if result is None:
+            result = self._lookup(rel)
+        self.prime(rel, result, now)
+        return result
+
+    def prime(self, rel: str, result: Optional[Resolved], now: Optional[float] = None) -> None:
+        with self._lock:
+            if len(self._cache) >= RESOLVE_CACHE_MAX:
+                self._cache.clear()
+            self._cache[rel] = ((now or time.monotonic()) + RESOLVE_TTL, result)
+
+    @staticmethod
+    def _revalidate(previous: Resolved) -> Optional[Resolved]:
+        abs_path, kind, _ = previous
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return None
+        if kind == _kind_of(st):
+            return abs_path, kind, st
+        return None
+
+    def _lookup(self, rel: str) -> Optional[Resolved]:
+        if not rel:
+            abs_path = self.root
+        else:
+            abs_path = os.path.realpath(os.path.join(self.root, rel))
+            # symlinks may still point outside the root
+            if not _is_subpath(abs_path, self.root):
+                return None
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return None
+        kind = _kind_of(st)
+        return (abs_path, kind, st) if kind else None
+
+
+def _kind_of(st: os.stat_result) -> Optional[str]:
+    if stat.S_ISDIR(st.st_mode):
+        return "dir"
+    if stat.S_ISREG(st.st_mode):
+        return "file"
+    return None
+
+
+_resolvers: Dict[str, PathResolver] = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_resolver(content_dir: str) -> PathResolver:
+    resolver = _resolvers.get(content_dir)
+    if resolver is None:
+        with _resolvers_lock:
+            resolver = _resolvers.setdefault(content_dir, PathResolver(content_dir))
+    return resolver
+
 
-        # Clean old timestamps beyond window
-        client_requests[ip] = [t for t in timestamps if now - t < TIME_WINDOW]
+class FileCache:
+    """LRU of small file bodies keyed by content digest, bounded by a total byte budget."""
 
-        # Check limit
-        if len(client_requests[ip]) < REQUESTS_PER_SECOND:
-            client_requests[ip].append(now)
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.budget:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data
+            self._size += len(data)
+            self._evict()
+
+    def resize(self, budget: int) -> None:
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.budget:
+            _, old = self._items.popitem(last=False)
+            self._size -= len(old)
+
+
+class _Mapping:
+    __slots__ = ("mm", "path", "mtime_ns", "refs", "last_used", "retired")
+
+    def __init__(self, mm: mmap.mmap, path: str, mtime_ns: int):
+        self.mm = mm
+        # the file the mapping was made from; other paths with the same content borrow it
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.retired = False
+
+    def still_valid(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            # unlinked: the mapping still holds the old, unchanged pages
             return True
-        return False
+        return st.st_mtime_ns == self.mtime_ns and st.st_size == len(self.mm)
+
+
+class MmapPool:
+    """Shared read-only mappings of large files, keyed by content digest.
+
+    Every request for the same contents borrows the same mapping, whatever
+    path it came in through, so concurrent readers share the page cache.
+    Mappings are reference counted and closed once they have been idle for
+    MMAP_IDLE seconds.
+    """
+
+    def __init__(self, idle: float):
+        self.idle = idle
+        self._maps: Dict[str, _Mapping] = {}
+        self._lock = threading.Lock()
+        self._next_reap = 0.0
+
+    def acquire(self, digest: str, path: str, st: os.stat_result) -> _Mapping:
+        while True:
+            with self._lock:
+                entry = self._maps.get(digest)
+                if entry is not None:
+                    entry.refs += 1
+                    entry.last_used = time.monotonic()
+            if entry is None:
+                # opening and mapping can be slow, so it happens outside the pool lock;
+                # concurrent cold requests for the same contents share one open
+                FLIGHTS.do(("mmap", digest), lambda: self._open(digest, path, st), COALESCE_WAIT)
+                continue
+            if entry.path == path or entry.still_valid():
+                return entry
+            # the source file was rewritten in place, its pages no longer hold this content
+            with self._lock:
+                if self._maps.get(digest) is entry:
+                    del self._maps[digest]
+                    entry.retired = True
+            self.release(entry)
+
+    def _open(self, digest: str, path: str, st: os.stat_result) -> None:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) != st.st_size:
+            # changed since it was stat()-ed, let the caller retry later
+            mm.close()
+            raise OSError(f"{path} changed while opening")
+        with self._lock:
+            if digest in self._maps:
+                # a caller that gave up waiting on FLIGHTS got there first
+                mm.close()
+                return
+            self._maps[digest] = _Mapping(mm, path, st.st_mtime_ns)
+
+    def release(self, entry: _Mapping) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry.refs -= 1
+            entry.last_used = now
+            if entry.retired:
+                self._close_retired(entry)
+            if now >= self._next_reap:
+                self._reap(now)
+
+    def reap(self) -> None:
+        """Close idle mappings; called periodically so they go away even without traffic."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_reap:
+                self._reap(now)
+
+    @staticmethod
+    def _close_retired(entry: _Mapping) -> None:
+        if entry.refs == 0:
+            try:
+                entry.mm.close()
+            except BufferError:
+                # a view is still alive, the mapping goes away with it
+                pass
+
+    def _reap(self, now: float) -> None:
+        self._next_reap = now + 1.0
+        for key, entry in list(self._maps.items()):
+            if entry.refs == 0 and now - entry.last_used >= self.idle:
+                try:
+                    entry.mm.close()
+                except BufferError:
+                    # a view is still alive somewhere, try again on the next pass
+                    continue
+                del self._maps[key]
+
+
+FILE_CACHE = FileCache(CACHE_BUDGET)
+MMAPS = MmapPool(MMAP_IDLE)
+
+Body = Union[bytes, memoryview]
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one.
+
+    The first caller runs the function; callers arriving while it runs wait
+    for its result instead of repeating the work. A waiter that times out,
+    or whose leader failed, runs the function itself.
+    """
+
+    def __init__(self):
+        self._calls: Dict[tuple, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: tuple, fn: Callable[[], object], timeout: float):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(timeout) and call.error is None:
+                return call.result
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+FLIGHTS = SingleFlight()
+
+
+FileId = Tuple[int, int]  # (st_dev, st_ino)
+
+
+class ContentIndex:
+    """Content digests of served files, so identical files share one copy in memory.
+
+    Each inode is hashed once per version (mtime, size). Every path whose
+    contents hash the same then uses the same FILE_CACHE entry, mmap and ETag.
+    """
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self._versions: Dict[FileId, Tuple[int, int, str]] = {}
+        self._aliases: Dict[str, Set[FileId]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def digest(self, path: str, st: os.stat_result) -> str:
+        file_id = (st.st_dev, st.st_ino)
+        with self._lock:
+            known = self._versions.get(file_id)
+        if known is not None and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return known[2]
+        # concurrent first requests for the same file share one hashing pass
+        digest = FLIGHTS.do(("hash",) + file_id + (st.st_mtime_ns, st.st_size),
+                            lambda: self._hash(path, st), COALESCE_WAIT)
+        self._record(file_id, st, digest)
+        return digest
+
+    @staticmethod
+    def _hash(path: str, st: os.stat_result) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            if st.st_size <= CACHE_MAX_FILE:
+                data = f.read()
+                if len(data) != st.st_size:
+                    raise OSError(f"{path} changed while reading")
+                h.update(data)
+                digest = h.hexdigest()
+                # it is about to be served from FILE_CACHE, keep the read
+                FILE_CACHE.put(digest, data)
+                return digest
+            size = 0
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+                size += len(chunk)
+        if size != st.st_size:
+            raise OSError(f"{path} changed while reading")
+        return h.hexdigest()
+
+    def _record(self, file_id: FileId, st: os.stat_result, digest: str) -> None:
+        with self._lock:
+            old = self._versions.get(file_id)
+            if old is not None:
+                aliases = self._aliases.get(old[2])
+                if aliases is not None:
+                    aliases.discard(file_id)
+                    if not aliases:
+                        del self._aliases[old[2]], self._sizes[old[2]]
+            elif len(self._versions) >= self.max_files:
+                self._versions.clear()
+                self._aliases.clear()
+                self._sizes.clear()
+            self._versions[file_id] = (st.st_mtime_ns, st.st_size, digest)
+            self._aliases.setdefault(digest, set()).add(file_id)
+            self._sizes[digest] = st.st_size
+
+    def stats(self) -> Tuple[int, int, int]:
+        """(files indexed, distinct contents, bytes that separate copies would have taken)."""
+        with self._lock:
+            saved = sum((len(ids) - 1) * self._sizes[d] for d, ids in self._aliases.items())
+            return len(self._versions), len(self._aliases), saved
+
+
+CONTENT = ContentIndex(RESOLVE_CACHE_MAX * 4)
+
+
+def content_report() -> str:
+    files, unique, saved = CONTENT.stats()
+    return f"{files} files, {unique} distinct contents, dedup saves {file_size(saved)}"
+
+
+def _load_small(path: str, st: os.stat_result, digest: str) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) != st.st_size:
+        raise OSError(f"{path} changed while reading")
+    FILE_CACHE.put(digest, data)
+    return data
+
+
+def open_body(path: str, st: os.stat_result, digest: str) -> Tuple[Body, Callable[[], None]]:
+    """Return the file contents and a release callback.
+
+    Small files come from FILE_CACHE, larger ones are served straight from a
+    shared mmap. Both are keyed by the content digest from CONTENT.
+    """
+    if st.st_size <= CACHE_MAX_FILE:
+        data = FILE_CACHE.get(digest)
+        if data is None:
+            # concurrent misses for the same contents share one read
+            data = FLIGHTS.do(("file", digest), lambda: _load_small(path, st, digest), COALESCE_WAIT)
+        return data, lambda: None
+
+    entry = MMAPS.acquire(digest, path, st)
+    view = memoryview(entry.mm)
+
+    def release():
+        view.release()
+        MMAPS.release(entry)
+
+    return view, release
+
+
+def parse_headers(data: bytes) -> Dict[str, str]:
+    headers = {}
+    head = data.split(b"\r\n\r\n", 1)[0]
+    for raw in head.split(b"\r\n")[1:]:
+        name, sep, value = raw.partition(b":")
+        if sep:
+            headers[name.strip().lower().decode("latin-1")] = value.strip().decode("latin-1")
+    return headers
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into inclusive (start, end).
+
+    Returns None when the whole file should be sent and raises ValueError when
+    the range cannot be satisfied.
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, sep, last = value[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        if first.isdigit() or last.isdigit():
+            raise
+        return None
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def allow_request(ip: str) -> bool:
+    #  Check if request from IP should be allowed based on rate limit
+    global CLIENT_WINDOWS
+    now = time.time()
+    config = CONFIG
+    key = ip_key(ip)
+
+    with requests_lock:
+        if CLIENT_WINDOWS.limit != config.requests_per_second:
+            # limit changed on reload, the ring size changes with it
+            CLIENT_WINDOWS = ClientWindows(config.requests_per_second)
+        return CLIENT_WINDOWS.allow(key, now, config.time_window)
 
 
 def _respond_429(conn):
@@ -118,11 +897,54 @@ def _respond_429(conn):
              "Content-Length": str(len(body)), "Connection": "close"}, body)
 
 
-def _minimal_listing_html(req_path: str, abs_dir: str) -> bytes:
+def _respond_503(conn):
+    respond(conn, "503 Service Unavailable",
+            {"Content-Type": "text/plain", "Retry-After": "1", "Connection": "close"},
+            b"Server busy, try again shortly")
+
+
+# (name, is_dir, size, mtime) already formatted for the listing table
+ListingRow = Tuple[str, bool, str, str]
+_listings: Dict[str, Tuple[int, float, List[ListingRow]]] = {}
+_listings_lock = threading.Lock()
+
+
+def listing_rows(abs_dir: str, st: Optional[os.stat_result] = None) -> Optional[List[ListingRow]]:
+    """Directory entries with their size and mtime, cached until the directory changes.
+
+    Files changing in place do not touch the directory mtime, so entries also
+    expire after RESOLVE_TTL seconds.
+    """
     import datetime as _dt
     try:
-        entries = sorted(os.listdir(abs_dir))
+        if st is None:
+            st = os.stat(abs_dir)
+        now = time.monotonic()
+        cached = _listings.get(abs_dir)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] > now:
+            return cached[2]
+
+        rows = []
+        with os.scandir(abs_dir) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                try:
+                    is_directory = entry.is_dir()
+                    entry_st = entry.stat()
+                except OSError:
+                    continue
+                size = "—" if is_directory else file_size(entry_st.st_size)
+                mtime = _dt.datetime.fromtimestamp(entry_st.st_mtime).strftime("%Y-%m-%d %H:%M")
+                rows.append((entry.name, is_directory, size, mtime))
     except OSError:
+        return None
+    with _listings_lock:
+        _listings[abs_dir] = (st.st_mtime_ns, now + RESOLVE_TTL, rows)
+    return rows
+
+
+def _minimal_listing_html(req_path: str, abs_dir: str, st: Optional[os.stat_result] = None) -> bytes:
+    entries = listing_rows(abs_dir, st)
+    if entries is None:
         return b"<html><body><h1>Forbidden</h1></body></html>"
 
     lines = [
@@ -178,23 +1000,17 @@ def _minimal_listing_html(req_path: str, abs_dir: str) -> bytes:
         parent = "/" if not parent else parent + "/"
         lines.append(f'<a class="parent-link" href="{quote(parent)}">⬆ Parent directory</a>')
     lines.extend(["<table>", "<thead><tr><th>Name</th><th>Size</th><th>Last modified</th><th>Hits</th></tr></thead>", "<tbody>"])
-    for name in entries:
-        full = os.path.join(abs_dir, name)
-        is_directory = os.path.isdir(full)
-        if os.path.isdir(full):
+    for name, is_directory, size, mtime in entries:
+        if is_directory:
             href = quote(name) + "/"
             row_class = "dir"
-            size = "—"
         else:
             href = quote(name)
             row_class = "file"
-            size = file_size(os.path.getsize(full))
-        ts = os.path.getmtime(full)
-        mtime = _dt.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
         child_req_path = req_path + (name + "/" if is_directory else name)
         hits = COUNTS.get(child_req_path, 0)
         lines.append(
-            f'<tr class="{row_class}"><td><a href="{href}">{name if not os.path.isdir(full) else name + "/"}</a></td>'
+            f'<tr class="{row_class}"><td><a href="{href}">{name if not is_directory else name + "/"}</a></td>'
             f"<td>{size}</td><td>{mtime}</td><td>{hits}</td></tr>"
         )
 
@@ -240,6 +1056,12 @@ def _respond_301(conn, location: str):
              "Content-Length": str(len(body)), "Connection": "close"}, body)
 
 
+def _respond_500(conn):
+    respond(conn, "500 Internal Server Error",
+            {"Content-Type": "text/plain", "Connection": "close"},
+            b"Internal Server Error")
+
+
 def _respond_404(conn):
     body = b"""<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
@@ -278,127 +1100,761 @@ def _respond_404(conn):
             {"Content-Type": "text/html; charset=utf-8",
              "Content-Length": str(len(body)), "Connection": "close"}, body)
 
-# multithreaded handler
-def _serve_connection(conn: socket.socket, addr, content_dir: str):
-    # Multithreaded handler with rate limiting
+class ServerConfig:
+    """Settings that can be swapped at runtime (SIGHUP). Instances are never mutated."""
+    __slots__ = ("content_dir", "requests_per_second", "time_window", "cache_budget")
+
+    def __init__(self, content_dir: str, requests_per_second: int = REQUESTS_PER_SECOND,
+                 time_window: float = TIME_WINDOW, cache_budget: int = CACHE_BUDGET):
+        self.content_dir = content_dir
+        self.requests_per_second = requests_per_second
+        self.time_window = time_window
+        self.cache_budget = cache_budget
+
+    @classmethod
+    def load(cls, content_dir: str, path: Optional[str]) -> "ServerConfig":
+        """Build a config from the defaults, overridden by the JSON file at `path` if given."""
+        values = {}
+        if path:
+            with open(path) as f:
+                values = json.load(f)
+        config = cls(
+            os.path.abspath(values.get("content_dir", content_dir)),
+            int(values.get("requests_per_second", REQUESTS_PER_SECOND)),
+            float(values.get("time_window", TIME_WINDOW)),
+            int(values.get("cache_budget", CACHE_BUDGET)),
+        )
+        if not os.path.isdir(config.content_dir):
+            raise ValueError(f"Directory '{config.content_dir}' does not exist.")
+        return config
+
+
+CONFIG = ServerConfig(os.getcwd())
+
+
+def apply_config(config: ServerConfig) -> None:
+    # requests read CONFIG once, so swapping the reference is atomic for them
+    global CONFIG
+    FILE_CACHE.resize(config.cache_budget)
+    CONFIG = config
+
+
+class Lifecycle:
+    """Tracks in-flight requests so shutdown can drain them, and carries the signal flags."""
+
+    def __init__(self):
+        self.stopping = threading.Event()
+        self.reload_requested = False
+        self.served = 0
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def begin(self) -> None:
+        with self._cond:
+            self._active += 1
+
+    def end(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self.served += 1
+            if self._active == 0:
+                self._cond.notify_all()
+
+    def drain(self, timeout: float) -> int:
+        """Wait until no request is in flight or timeout passes; returns how many are left."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._active
+
+    def install_signals(self) -> None:
+        def stop(signum, frame):
+            self.stopping.set()
+
+        def reload(signum, frame):
+            self.reload_requested = True
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, reload)
+
+
+LIFECYCLE = Lifecycle()
+
+
+def load_counts() -> None:
+    if not COUNTS_FILE or not os.path.exists(COUNTS_FILE):
+        return
     try:
-        client_ip = addr[0]
+        with open(COUNTS_FILE) as f:
+            COUNTS.update({str(k): int(v) for k, v in json.load(f).items()})
+    except (OSError, ValueError) as e:
+        print(f"Could not load counters from {COUNTS_FILE}: {e}")
 
-         # Check rate limit
-        if not allow_request(client_ip):
-            _respond_429(conn)
-            return
 
-        time.sleep(0.5)  # simulate work
-        data = conn.recv(4096)
-        if not data:
-            return
+def flush_counts() -> None:
+    if not COUNTS_FILE:
+        return
+    with COUNTS_LOCK:
+        snapshot = dict(COUNTS.items())
+    tmp = COUNTS_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, COUNTS_FILE)
 
-        line = data.split(b"\r\n", 1)[0].decode(errors="replace")
-        parts = line.split()
-        if len(parts) != 3:
-            respond(conn, "400 Bad Request",
-                    {"Content-Type": "text/plain", "Connection": "close"},
-                    b"Bad Request")
-            return
 
-        method, target, version = parts
-        if method != "GET":
-            respond(conn, "405 Method Not Allowed",
-                    {"Allow": "GET", "Content-Type": "text/plain", "Connection": "close"},
-                    b"Only GET is allowed")
-            return
+def reload_config() -> None:
+    LIFECYCLE.reload_requested = False
+    try:
+        config = ServerConfig.load(CONFIG.content_dir, CONFIG_FILE)
+    except (OSError, ValueError) as e:
+        print(f"Reload failed, keeping current config: {e}")
+        return
+    apply_config(config)
+    print(f"Reloaded config: serving {config.content_dir}, "
+          f"{config.requests_per_second} req/{config.time_window}s, cache {file_size(config.cache_budget)}")
 
-        if not target.startswith("/"):
-            target = "/"
-        target = unquote(target)
-        _bump_count(target)
 
-        # map to filesystem under content_dir
-        requested_rel = "" if target == "/" else target.lstrip("/")
-        requested_abs = os.path.realpath(os.path.join(content_dir, requested_rel))
+class RouteQueue:
+    """A bounded wait queue in front of a fixed number of worker slots."""
 
-        # 1) traversal guard
-        if not _is_subpath(requested_abs, content_dir):
-            _respond_404(conn)
-            return
+    def __init__(self, name: str, workers: int, max_waiting: int):
+        self.name = name
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self._slots = threading.Semaphore(workers)
+        self._waiting = 0
+        self._lock = threading.Lock()
 
-        # 2) directory
-        if os.path.isdir(requested_abs):
-            if not target.endswith("/"):
-                _respond_301(conn, target + "/")
+    def acquire(self, timeout: float) -> bool:
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                return False
+            self._waiting += 1
+        try:
+            return self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self) -> None:
+        self._slots.release()
+
+    def reacquire(self) -> None:
+        # used by requests that already passed the queue once, so no limit or timeout
+        self._slots.acquire()
+
+
+class Scheduler:
+    """Splits MAX_WORKERS between small files, listings and bulk transfers by weight.
+
+    A burst of PDF downloads can then only use the bulk budget, and small
+    cached files and listings keep their own workers.
+    """
+
+    def __init__(self, total_workers: int, weights: Dict[str, float], max_waiting: int):
+        total = sum(weights.values()) or 1.0
+        self.queues = {
+            name: RouteQueue(name, max(1, round(total_workers * weight / total)), max_waiting)
+            for name, weight in weights.items()
+        }
+
+    @staticmethod
+    def parse_weights(spec: str) -> Dict[str, float]:
+        weights = {"small": 1.0, "listing": 1.0, "bulk": 1.0}
+        for item in spec.split(","):
+            name, sep, value = item.partition("=")
+            if sep and name.strip() in weights:
+                weights[name.strip()] = max(float(value), 0.0)
+        return weights
+
+    def route_for(self, kind: str, st: os.stat_result) -> RouteQueue:
+        if kind == "dir":
+            return self.queues["listing"]
+        if st.st_size >= BULK_THRESHOLD:
+            return self.queues["bulk"]
+        return self.queues["small"]
+
+
+SCHEDULER = Scheduler(MAX_WORKERS, Scheduler.parse_weights(SCHED_WEIGHTS), SCHED_QUEUE)
+
+
+class TokenBucket:
+    """Byte token bucket refilled at `rate` bytes/s.
+
+    reserve() never refuses: it takes the tokens (possibly going into debt)
+    and returns how long the caller has to wait before sending. Senders are
+    therefore served in the order they asked, which with small quanta gives
+    concurrent downloads an equal share.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.burst = max(rate, SEND_QUANTUM)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, n: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self) -> bool:
+        with self._lock:
+            return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+
+class Bandwidth:
+    """Per-IP and global byte-rate shaping for large responses."""
+
+    def __init__(self, per_ip: int, total: int):
+        self.per_ip = per_ip
+        self.total = TokenBucket(total) if total > 0 else None
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket_for(self, ip: str) -> TokenBucket:
+        key = ip_key(ip)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= 1024:
+                    # forget clients whose bucket has refilled completely
+                    self._buckets = {k: b for k, b in self._buckets.items() if not b.idle()}
+                bucket = self._buckets[key] = TokenBucket(self.per_ip)
+            return bucket
+
+    def throttle_for(self, ip: str, route: "RouteQueue") -> Optional[Callable[[int], None]]:
+        buckets = []
+        if self.per_ip > 0:
+            buckets.append(self._bucket_for(ip))
+        if self.total is not None:
+            buckets.append(self.total)
+        if not buckets:
+            return None
+
+        def throttle(n: int) -> None:
+            delay = max(bucket.reserve(n) for bucket in buckets)
+            if delay <= 0:
                 return
-            body = _minimal_listing_html(target, requested_abs)
-            respond(conn, "200 OK",
-                    {"Content-Type": "text/html; charset=utf-8",
-                     "Content-Length": str(len(body)), "Connection": "close"},
-                    body)
-            return
+            # give the worker slot to another request while we wait for tokens;
+            # once shutdown starts, stop waiting so the drain finishes quickly
+            route.release()
+            try:
+                LIFECYCLE.stopping.wait(delay)
+            finally:
+                route.reacquire()
 
-        # 3) file
-        if not os.path.isfile(requested_abs):
-            _respond_404(conn)
-            return
+        return throttle
+
+
+BANDWIDTH = Bandwidth(BANDWIDTH_PER_IP, BANDWIDTH_TOTAL)
+
+
+class TraceRecorder:
+    """Records one JSON line per request: {"t", "path", "client", "status", "bytes"}.
+
+    t is seconds since the server started, client is a short hash of the
+    peer address and bytes counts everything written (head and body).
+    Lines are buffered and appended to the file in batches and on shutdown.
+    """
 
-        ext = os.path.splitext(requested_abs)[1].lower()
-        if ext not in ALLOWED_EXTENSIONS:
-            _respond_404(conn)
+    BATCH = 512
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.time()
+        self._local = threading.local()
+        self._lines: List[str] = []
+        self._lock = threading.Lock()
+
+    def begin(self, client_ip: str, data: bytes) -> None:
+        parts = data.split(b"\r\n", 1)[0].split()
+        local = self._local
+        local.t = time.time() - self.started
+        local.path = parts[1].decode(errors="replace") if len(parts) > 1 else ""
+        local.client = hashlib.blake2b(client_ip.encode(), digest_size=4).hexdigest()
+        local.status = 0
+        local.sent = 0
+
+    def sending(self, buffers) -> None:
+        # called from _send_gather, so this sees every byte of the response
+        local = self._local
+        if not hasattr(local, "sent"):
             return
+        for buf in buffers:
+            if not local.status and len(buf) >= 12:
+                # the first write of a response starts with "HTTP/1.1 NNN"
+                local.status = int(bytes(buf[9:12]))
+            local.sent += len(buf)
 
-        mime_type, _ = mimetypes.guess_type(requested_abs)
-        if mime_type is None:
-            _respond_404(conn)
+    def end(self) -> None:
+        local = self._local
+        if not hasattr(local, "sent"):
             return
+        line = json.dumps({"t": round(local.t, 4), "path": local.path, "client": local.client,
+                           "status": local.status, "bytes": local.sent}, separators=(",", ":"))
+        del local.sent
+        with self._lock:
+            self._lines.append(line)
+            if len(self._lines) < self.BATCH:
+                return
+            lines, self._lines = self._lines, []
+            self._write(lines)
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._lines = self._lines, []
+            self._write(lines)
+
+    def _write(self, lines: List[str]) -> None:
+        if lines:
+            with open(self.path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+
+
+TRACE: Optional[TraceRecorder] = TraceRecorder(TRACE_FILE) if TRACE_FILE else None
+
 
+def _read_request(conn: socket.socket, pending: bytes) -> Tuple[Optional[bytes], bytes]:
+    """Read one request head; returns (head, bytes that belong to the next request).
+
+    Once the first byte is in, the whole head must arrive within
+    REQUEST_TIMEOUT, so a client trickling header lines cannot hold a thread.
+    """
+    data = pending
+    deadline = time.monotonic() + REQUEST_TIMEOUT if data else None
+    while True:
+        for sep in (b"\r\n\r\n", b"\n\n"):
+            pos = data.find(sep)
+            if pos > MAX_HEADER_BYTES:
+                raise RequestTooLarge()
+            if pos != -1:
+                return data[:pos + len(sep)], data[pos + len(sep):]
+        if len(data) > MAX_HEADER_BYTES:
+            raise RequestTooLarge()
+        if deadline is not None and time.monotonic() > deadline:
+            raise socket.timeout("request head took too long")
+        chunk = conn.recv(4096)
+        if not chunk:
+            return None, b""
+        if deadline is None:
+            deadline = time.monotonic() + REQUEST_TIMEOUT
+        data += chunk
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+def _wants_keep_alive(version: str, headers: Dict[str, str]) -> bool:
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        return connection != "close"
+    return connection == "keep-alive"
+
+
+class TlsListener:
+    """HTTPS on TLS_PORT. The acceptor only accepts; handshakes run in the connection threads."""
+
+    def __init__(self, cert: Optional[str] = None, key: Optional[str] = None):
+        # without a cert/key pair, a self-signed one lives in a temp dir until close()
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+        if not (cert and key):
+            self._tmp = tempfile.TemporaryDirectory(prefix="server_mt-tls-")
+            try:
+                cert, key = self.self_signed(self._tmp.name)
+            except BaseException:
+                self.close()
+                raise
+        self.cert = cert
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         try:
-            with open(requested_abs, "rb") as f:
-                body = f.read()
-            respond(conn, "200 OK",
-                    {"Content-Type": mime_type,
-                     "Content-Length": str(len(body)), "Connection": "close"},
-                    body)
+            self.context.load_cert_chain(cert, key)
+        except BaseException:
+            self.close()
+            raise
+        # resumption needs nothing extra: the server context issues TLS 1.3 session
+        # tickets (num_tickets, 2 by default) and keeps a TLS 1.2 session cache
+        self.handshakes = 0
+        self.resumed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def self_signed(tmp: str) -> Tuple[str, str]:
+        """Generate a localhost certificate/key pair in `tmp` with the openssl CLI."""
+        cert, key = os.path.join(tmp, "localhost.crt"), os.path.join(tmp, "localhost.key")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+                        "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+                        "-keyout", key, "-out", cert],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return cert, key
+
+    def close(self) -> None:
+        # removes the generated private key
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+    def accept_loop(self, s: socket.socket) -> None:
+        while not LIFECYCLE.stopping.is_set():
+            try:
+                conn, addr = s.accept()
+            except (socket.timeout, InterruptedError):
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn, addr), daemon=True).start()
+
+    def serve(self, conn: socket.socket, addr) -> None:
+        conn.settimeout(REQUEST_TIMEOUT)
+        try:
+            tls = self.context.wrap_socket(conn, server_side=True, do_handshake_on_connect=False)
+            tls.do_handshake()
         except OSError:
-            respond(conn, "500 Internal Server Error",
-                    {"Content-Type": "text/plain", "Connection": "close"},
-                    b"Internal Server Error")
+            with self._lock:
+                self.failed += 1
+            conn.close()
+            return
+        with self._lock:
+            self.handshakes += 1
+            self.resumed += tls.session_reused
+        _serve_connection(tls, addr)
+
+
+# multithreaded handler
+def _serve_connection(conn: socket.socket, addr):
+    # Multithreaded handler with rate limiting and keep-alive
+    try:
+        client_ip = addr[0]
+        conn.settimeout(KEEPALIVE_TIMEOUT)
+        pending = b""
+        for served in range(KEEPALIVE_MAX):
+            try:
+                data, pending = _read_request(conn, pending)
+            except RequestTooLarge:
+                respond(conn, "431 Request Header Fields Too Large",
+                        {"Content-Type": "text/plain", "Connection": "close"},
+                        b"Request Header Fields Too Large")
+                return
+            if not data:
+                return
+
+            LIFECYCLE.begin()
+            if TRACE is not None:
+                TRACE.begin(client_ip, data)
+            try:
+                 # Check rate limit
+                if not allow_request(client_ip):
+                    _respond_429(conn)
+                    return
+
+                time.sleep(0.5)  # simulate work
+                # stop reusing connections once shutdown has started
+                may_keep_alive = served + 1 < KEEPALIVE_MAX and not LIFECYCLE.stopping.is_set()
+                if not _handle_request(conn, client_ip, data, CONFIG.content_dir, may_keep_alive):
+                    return
+            finally:
+                if TRACE is not None:
+                    TRACE.end()
+                LIFECYCLE.end()
+    except OSError:
+        # client went away or sat idle past KEEPALIVE_TIMEOUT
+        pass
     finally:
         try:
             conn.close()
         except Exception:
             pass
 
+
+def _handle_request(conn: socket.socket, client_ip: str, data: bytes, content_dir: str,
+                    may_keep_alive: bool) -> bool:
+    """Answer one request; returns True if the connection can be reused."""
+    line = data.split(b"\r\n", 1)[0].decode(errors="replace")
+    headers = parse_headers(data)
+    parts = line.split()
+    if len(parts) != 3:
+        respond(conn, "400 Bad Request",
+                {"Content-Type": "text/plain", "Connection": "close"},
+                b"Bad Request")
+        return False
+
+    method, target, version = parts
+    if method != "GET":
+        respond(conn, "405 Method Not Allowed",
+                {"Allow": "GET", "Content-Type": "text/plain", "Connection": "close"},
+                b"Only GET is allowed")
+        return False
+
+    # errors always close the connection, successful responses may keep it open
+    keep_alive = may_keep_alive and _wants_keep_alive(version, headers)
+
+    if not target.startswith("/"):
+        target = "/"
+    target = unquote(target)
+    _bump_count(target)
+
+    # map to filesystem under content_dir (traversal is rejected lexically)
+    resolved = get_resolver(content_dir).resolve(target)
+    if resolved is None:
+        _respond_404(conn)
+        return False
+    requested_abs, kind, st = resolved
+    if kind == "dir" and not target.endswith("/"):
+        _respond_301(conn, target + "/")
+        return False
+
+    # cheap, listing and bulk requests each wait for their own worker budget
+    route = SCHEDULER.route_for(kind, st)
+    if not route.acquire(SCHED_WAIT):
+        _respond_503(conn)
+        return False
+    try:
+        throttle = BANDWIDTH.throttle_for(client_ip, route)
+        return _serve_resolved(conn, target, headers, requested_abs, kind, st, keep_alive, throttle)
+    finally:
+        route.release()
+
+
+def _serve_resolved(conn: socket.socket, target: str, headers: Dict[str, str],
+                    requested_abs: str, kind: str, st: os.stat_result, keep_alive: bool,
+                    throttle: Optional[Callable[[int], None]]) -> bool:
+    connection = "keep-alive" if keep_alive else "close"
+
+    # 1) directory
+    if kind == "dir":
+        # concurrent requests for the same listing share one rendering
+        body = FLIGHTS.do(("listing", target, requested_abs, st.st_mtime_ns),
+                          lambda: _minimal_listing_html(target, requested_abs, st), COALESCE_WAIT)
+        respond(conn, "200 OK",
+                {"Content-Type": "text/html; charset=utf-8",
+                 "Content-Length": str(len(body)), "Connection": connection},
+                body)
+        return keep_alive
+
+    # 2) file
+    ext = os.path.splitext(requested_abs)[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        _respond_404(conn)
+        return False
+
+    mime_type = MIME_TYPES.get(ext)
+    if mime_type is None:
+        _respond_404(conn)
+        return False
+
+    try:
+        digest = CONTENT.digest(requested_abs, st)
+    except OSError:
+        _respond_500(conn)
+        return False
+    etag = etag_for(digest)
+    if not_modified(headers, st, etag):
+        respond(conn, "304 Not Modified",
+                {"ETag": etag, "Last-Modified": http_date(st.st_mtime), "Connection": connection}, b"")
+        return keep_alive
+
+    try:
+        body, release = open_body(requested_abs, st, digest)
+    except OSError:
+        _respond_500(conn)
+        return False
+    try:
+        try:
+            byte_range = None
+            if range_applies(headers, st, etag):
+                byte_range = parse_range(headers.get("range"), st.st_size)
+        except ValueError:
+            respond(conn, "416 Range Not Satisfiable",
+                    {"Content-Range": f"bytes */{st.st_size}", "ETag": etag,
+                     "Last-Modified": http_date(st.st_mtime), "Content-Length": "0",
+                     "Connection": "close"}, b"")
+            return False
+        if byte_range is None:
+            send_buffers(conn, [file_head(st, digest, mime_type, keep_alive), body], throttle)
+        else:
+            start, end = byte_range
+            with memoryview(body)[start:end + 1] as part:
+                respond(conn, "206 Partial Content",
+                        {"Content-Type": mime_type, "Accept-Ranges": "bytes",
+                         "Content-Range": f"bytes {start}-{end}/{st.st_size}",
+                         "ETag": etag, "Content-Length": str(len(part)), "Connection": connection},
+                        part, throttle)
+        return keep_alive
+    finally:
+        release()
+
+
+def warm_up(config: ServerConfig) -> None:
+    """Walk the content root once and fill every cache the request path uses.
+
+    Primes the path resolver, listing metadata, content digests, the per-file
+    header blocks (ETag, Last-Modified) and FILE_CACHE for files up to
+    CACHE_MAX_FILE.
+    """
+    started = time.perf_counter()
+    rss_before = _max_rss()
+    resolver = get_resolver(config.content_dir)
+    dirs = files = cached = cached_bytes = 0
+    cached_digests = set()
+
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        abs_dir = os.path.join(resolver.root, rel) if rel else resolver.root
+        try:
+            dir_st = os.stat(abs_dir)
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            continue
+        resolver.prime(rel, (abs_dir, "dir", dir_st))
+        listing_rows(abs_dir, dir_st)
+        dirs += 1
+        for entry in entries:
+            if entry.is_symlink():
+                # resolved (and checked against the root) on first request instead
+                continue
+            child_rel = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(child_rel)
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            mime_type = MIME_TYPES.get(ext)
+            if mime_type is None or not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                st = entry.stat()
+                digest = CONTENT.digest(entry.path, st)
+            except OSError:
+                continue
+            resolver.prime(child_rel, (entry.path, "file", st))
+            file_head(st, digest, mime_type, False)
+            file_head(st, digest, mime_type, True)
+            files += 1
+            if st.st_size <= CACHE_MAX_FILE and cached_bytes + st.st_size <= config.cache_budget:
+                try:
+                    body, release = open_body(entry.path, st, digest)
+                    release()
+                except OSError:
+                    continue
+                cached += 1
+                if digest not in cached_digests:
+                    # identical files share the cached copy
+                    cached_digests.add(digest)
+                    cached_bytes += len(body)
+
+    elapsed = time.perf_counter() - started
+    rss_after = _max_rss()
+    rss = f", peak RSS +{file_size(rss_after - rss_before)}" if rss_after else ""
+    print(f"Warm-up: {dirs} directories, {files} files indexed, {cached} files "
+          f"({file_size(cached_bytes)}) cached in {elapsed * 1000:.0f} ms{rss}")
+    print(f"Content index: {content_report()}")
+
+
+def _max_rss() -> int:
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python server_mt.py <directory>")
         sys.exit(1)
-    content_dir = os.path.abspath(sys.argv[1])
-    if not os.path.isdir(content_dir):
-        print(f"Error: Directory '{content_dir}' does not exist.")
+    try:
+        config = ServerConfig.load(sys.argv[1], CONFIG_FILE)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
         sys.exit(1)
+    apply_config(config)
+    load_counts()
+    LIFECYCLE.install_signals()
+    if WARMUP == "on":
+        warm_up(config)
+    elif WARMUP == "background":
+        threading.Thread(target=warm_up, args=(config,), daemon=True).start()
 
-    print(f"Serving directory (MT - Thread per request): {content_dir}")
+    print(f"Serving directory (MT - Thread per request): {config.content_dir}")
     print(f"Server running on: http://0.0.0.0:{PORT}")
-    print("Press Ctrl+C to stop")
+    print("Worker budgets: " + ", ".join(f"{q.name}={q.workers}" for q in SCHEDULER.queues.values()))
+    print("Press Ctrl+C to stop (SIGHUP reloads config)")
+
+    tls_socket = tls = None
+    if TLS_PORT:
+        try:
+            tls = TlsListener(TLS_CERT, TLS_KEY)
+        except (OSError, ssl.SSLError, subprocess.CalledProcessError) as e:
+            print(f"Error: could not set up TLS: {e}")
+            sys.exit(1)
+        tls_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tls_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        tls_socket.bind((HOST, TLS_PORT))
+        tls_socket.listen()
+        tls_socket.settimeout(0.5)
+        threading.Thread(target=tls.accept_loop, args=(tls_socket,), daemon=True).start()
+        print(f"TLS listener on: https://0.0.0.0:{TLS_PORT} ({tls.cert})")
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if REUSE_PORT and hasattr(socket, "SO_REUSEPORT"):
+            # lets a new instance bind while this one drains
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         s.bind((HOST, PORT))
         s.listen()
+        # wake up regularly to notice signals
+        s.settimeout(0.5)
 
-        try:
-            while True:
+        while not LIFECYCLE.stopping.is_set():
+            if LIFECYCLE.reload_requested:
+                reload_config()
+            MMAPS.reap()
+            try:
                 conn, addr = s.accept()
-                # Create a new thread for each request
-                thread = threading.Thread(
-                    target=_serve_connection,
-                    args=(conn, addr, content_dir),
-                    daemon=True
-                )
-                thread.start()
-        except KeyboardInterrupt:
-            print("\nShutting down server...")
-            sys.exit(0)
+            except socket.timeout:
+                continue
+            except InterruptedError:
+                continue
+            # Create a new thread for each request
+            thread = threading.Thread(
+                target=_serve_connection,
+                args=(conn, addr),
+                daemon=True
+            )
+            thread.start()
+
+    if tls_socket is not None:
+        tls_socket.close()
+    print("\nShutting down server: stopped accepting, draining requests...")
+    left = LIFECYCLE.drain(DRAIN_TIMEOUT)
+    if left:
+        print(f"Drain timeout after {DRAIN_TIMEOUT:.0f}s, {left} request(s) cut off")
+    flush_counts()
+    print(f"Content index: {content_report()}")
+    if TRACE is not None:
+        TRACE.flush()
+        print(f"Trace written to {TRACE.path}")
+    if tls is not None:
+        print(f"TLS: {tls.handshakes} handshakes ({tls.resumed} resumed), {tls.failed} failed")
+        tls.close()
+    print(f"Served {LIFECYCLE.served} requests")
+    sys.stdout.flush()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()